@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -31,6 +33,29 @@ ALLOWED_HOSTS = ['*']
 # Base API URL for QR code generation
 BASE_API_URL = os.environ.get('BASE_API_URL', 'http://localhost:8000')
 
+# Upper bound for rendered QR images kept in each process
+QR_CACHE_MAX_BYTES = int(os.environ.get('QR_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+
+# Responses to requests with an Idempotency-Key header are replayed for this many seconds
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+# Dotted path of the marketplace search backend; 'auto' uses FTS5 on SQLite and LIKE scans elsewhere
+MARKETPLACE_SEARCH_BACKEND = os.environ.get('MARKETPLACE_SEARCH_BACKEND', 'auto')
+
+# Seconds a coupon reservation holds stock before it can be released
+COUPON_RESERVATION_SECONDS = int(os.environ.get('COUPON_RESERVATION_SECONDS', 120))
+
+# How per-source submissions for one day are merged into DailyActivity: 'max', 'sum' or 'priority'
+ACTIVITY_MERGE_POLICY = os.environ.get('ACTIVITY_MERGE_POLICY', 'max')
+ACTIVITY_SOURCE_PRIORITY = ['apple_health', 'google_fit', 'manual']
+
+# A balance checkpoint is stored after this many coin transactions of one user
+COIN_CHECKPOINT_INTERVAL = int(os.environ.get('COIN_CHECKPOINT_INTERVAL', 100))
+
+# When enabled, activity saves only enqueue a RecomputeJob and `process_recompute_jobs` applies rewards and totals
+STEPS_RECOMPUTE_ASYNC = os.environ.get('STEPS_RECOMPUTE_ASYNC', 'False') == 'True'
+STEPS_RECOMPUTE_MAX_ATTEMPTS = int(os.environ.get('STEPS_RECOMPUTE_MAX_ATTEMPTS', 5))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -45,6 +70,8 @@ INSTALLED_APPS = [
     'steps_tracking.apps.StepsTrackingConfig',
     'rewards.apps.RewardsConfig',
     'stuff.apps.StuffConfig',
+    'idempotency.apps.IdempotencyConfig',
+    'benchmarks.apps.BenchmarksConfig',
     'rest_framework',
     'rest_framework_simplejwt',
     'phonenumber_field',
@@ -90,10 +117,25 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Transactions take the write lock up front, so concurrent writers wait for it instead of failing mid-way
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
     }
 }
 
 
+# Per-process cache; point it at a shared backend such as Redis when running several workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'walkpoint',
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 5000))},
+    }
+}
+
+# Seconds a cached marketplace page lives; stock counters in it may lag by this much
+MARKETPLACE_CACHE_TTL = int(os.environ.get('MARKETPLACE_CACHE_TTL', 60))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -169,4 +211,5 @@ SIMPLE_JWT = {
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
-CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
\ No newline at end of file
@@ -0,0 +1,89 @@
+import json
+import logging
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from benchmarks.runner import run_scenario
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.seed import clear_seed, seed
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ("Seeds throwaway users, partner and coupons, drives the buy, redeem, activity and marketplace "
+            "endpoints from several threads against the configured database and reports throughput, "
+            "latency percentiles and queries per request.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f"Any of {', '.join(SCENARIOS)}; defaults to all.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per scenario.")
+        parser.add_argument('--concurrency', type=int, default=4, help="Client threads, each with its own connection.")
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--templates', type=int, default=20)
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--compare', help="Print the change against an earlier JSON result file.")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded data instead of deleting it.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        baseline = {}
+        if options['compare']:
+            try:
+                results = json.loads(Path(options['compare']).read_text())['results']
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError(f"Cannot read {options['compare']}: {error}")
+            baseline = {report['scenario']: report for report in results}
+
+        if clear_seed():
+            self.stdout.write("Removed data left over from an earlier run.")
+        data = seed(options['users'], options['templates'])
+        reports = []
+        # Failed requests are counted in the report, their tracebacks would drown it.
+        request_logger = logging.getLogger('django.request')
+        request_logger.disabled = True
+        try:
+            for name in options['scenarios'] or SCENARIOS:
+                report = run_scenario(SCENARIOS[name](), data, options['requests'], options['concurrency'])
+                reports.append(report)
+                self.print_report(report, baseline.get(name))
+        finally:
+            request_logger.disabled = False
+            if not options['keep']:
+                clear_seed()
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({
+                'commit': current_commit(),
+                'database': settings.DATABASES['default']['ENGINE'],
+                'created_at': timezone.now().isoformat(),
+                'results': reports,
+            }, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Saved results to {options['output']}"))
+
+    def print_report(self, report, baseline):
+        latency = report['latency_ms']
+        line = (f"{report['scenario']:<12} {report['requests_per_second']:>8} req/s  "
+                f"p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms  "
+                f"{report['queries_per_request']} queries/req  {report['errors']} errors")
+        if baseline and baseline['requests_per_second']:
+            throughput = report['requests_per_second'] / baseline['requests_per_second'] - 1
+            p95 = latency['p95'] - baseline['latency_ms']['p95']
+            queries = report['queries_per_request'] - baseline['queries_per_request']
+            line += f"  ({throughput:+.0%} req/s, p95 {p95:+.2f}ms, {queries:+.2f} queries/req)"
+        self.stdout.write(line)
@@ -0,0 +1,78 @@
+import math
+import threading
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of already sorted ``values``."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def run_scenario(scenario, data, requests, concurrency=1):
+    """
+    Sends ``requests`` requests of ``scenario`` from ``concurrency`` threads, each
+    with its own test client and database connection, and returns the report.
+    A single worker runs in the calling thread.
+    """
+    scenario.prepare(data, requests)
+    indexes = iter(range(requests))
+    lock = threading.Lock()
+    samples = []
+
+    def work():
+        client = APIClient()
+        # Server errors count as failed requests instead of stopping the run.
+        client.raise_request_exception = False
+        while True:
+            with lock:
+                index = next(indexes, None)
+            if index is None:
+                return
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = scenario.send(client, data, index)
+                elapsed = time.perf_counter() - started
+            with lock:
+                samples.append((elapsed, len(queries), response.status_code < 400))
+
+    def work_in_thread():
+        try:
+            work()
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        threads = [threading.Thread(target=work_in_thread) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        work()
+    return build_report(scenario.name, samples, time.perf_counter() - started, concurrency)
+
+
+def build_report(name, samples, seconds, concurrency):
+    latencies = sorted(elapsed * 1000 for elapsed, _, _ in samples)
+    return {
+        'scenario': name,
+        'requests': len(samples),
+        'concurrency': concurrency,
+        'errors': sum(not ok for _, _, ok in samples),
+        'seconds': round(seconds, 3),
+        'requests_per_second': round(len(samples) / seconds, 1) if seconds else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(latencies[-1], 2) if latencies else 0.0,
+        },
+        'queries_per_request': round(sum(queries for _, queries, _ in samples) / len(samples), 2) if samples else 0.0,
+    }
@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+
+from rewards.models import UserCoupon
+
+
+class Scenario:
+    """One hot path. ``send`` issues request number ``index`` with the given test client."""
+    name = None
+
+    def prepare(self, data, requests):
+        pass
+
+    def authenticate(self, client, data, user):
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {data.tokens[user.pk]}')
+
+    def send(self, client, data, index):
+        raise NotImplementedError
+
+
+class BuyScenario(Scenario):
+    name = 'buy'
+
+    def send(self, client, data, index):
+        self.authenticate(client, data, data.users[index % len(data.users)])
+        template = data.templates[index % len(data.templates)]
+        return client.post(reverse('buy_coupon', kwargs={'template_id': template.pk}))
+
+
+class RedeemScenario(Scenario):
+    name = 'redeem'
+
+    def prepare(self, data, requests):
+        self.coupons = UserCoupon.objects.bulk_create([
+            UserCoupon(
+                user=data.users[i % len(data.users)],
+                template=data.templates[i % len(data.templates)],
+                expires_at=timezone.now() + timedelta(days=30)
+            )
+            for i in range(requests)
+        ])
+
+    def send(self, client, data, index):
+        self.authenticate(client, data, data.partner.user)
+        return client.post(reverse('redeem_coupon', kwargs={'uuid': self.coupons[index].redemption_uuid}))
+
+
+class ActivityScenario(Scenario):
+    name = 'activity'
+
+    def prepare(self, data, requests):
+        self.now = timezone.now()
+
+    def send(self, client, data, index):
+        # Each user walks back one day per round, so every request stores a new day.
+        user = data.users[index % len(data.users)]
+        self.authenticate(client, data, user)
+        date = self.now - timedelta(days=index // len(data.users))
+        return client.post(
+            reverse('daily_activity_list_create'),
+            {'date': date.isoformat(), 'steps': 4000 + index % 9000, 'source_app': 'manual'},
+            format='json'
+        )
+
+
+class MarketplaceScenario(Scenario):
+    name = 'marketplace'
+
+    def send(self, client, data, index):
+        self.authenticate(client, data, data.users[index % len(data.users)])
+        return client.get(reverse('marketplace'))
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (BuyScenario, RedeemScenario, ActivityScenario, MarketplaceScenario)}
@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from partners.models import Partner, CouponCategory, CouponTemplate
+
+User = get_user_model()
+
+EMAIL_DOMAIN = 'loadtest.invalid'
+
+
+@dataclass
+class SeedData:
+    users: list
+    tokens: dict
+    partner: Partner
+    templates: list
+
+
+def seed(users=50, templates=20, prefix='loadtest'):
+    """
+    Creates buyers with plenty of coins, one partner and its unlimited coupon templates.
+    Every row hangs off users with ``prefix`` emails, so ``clear_seed`` removes all of it.
+    """
+    password = make_password(None)
+    buyers = User.objects.bulk_create([
+        User(email=f'{prefix}-user{i}@{EMAIL_DOMAIN}', password=password, coins=10 ** 9)
+        for i in range(users)
+    ])
+    partner_user = User.objects.create(
+        email=f'{prefix}-partner@{EMAIL_DOMAIN}', password=password, is_partner=True
+    )
+    partner = Partner.objects.create(user=partner_user, name=f'{prefix} partner')
+    category, _ = CouponCategory.objects.get_or_create(slug=f'{prefix}', defaults={'name': f'{prefix} category'})
+    coupon_templates = CouponTemplate.objects.bulk_create([
+        CouponTemplate(
+            partner=partner,
+            category=category,
+            title=f'{prefix} coupon {i}',
+            description='Seeded by the loadtest command',
+            cost_coins=10 + i
+        )
+        for i in range(templates)
+    ])
+
+    tokens = {
+        user.pk: str(RefreshToken.for_user(user).access_token)
+        for user in [*buyers, partner_user]
+    }
+    return SeedData(users=buyers, tokens=tokens, partner=partner, templates=coupon_templates)
+
+
+def clear_seed(prefix='loadtest'):
+    deleted, _ = User.objects.filter(email__startswith=f'{prefix}-', email__endswith=f'@{EMAIL_DOMAIN}').delete()
+    CouponCategory.objects.filter(slug=prefix).delete()
+    return deleted
@@ -0,0 +1,62 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from .runner import percentile, run_scenario
+from .scenarios import SCENARIOS
+from .seed import clear_seed, seed
+
+User = get_user_model()
+
+# Queries per request on the hot paths; raise them only together with a reason in the commit.
+QUERY_BUDGETS = {
+    'buy': 14,
+    'redeem': 7,
+    'activity': 16,
+}
+
+
+class LoadTestTest(TestCase):
+    """Тесты для нагрузочного прогона горячих эндпоинтов"""
+
+    def setUp(self):
+        self.data = seed(users=5, templates=3)
+
+    def test_scenarios_within_query_budget(self):
+        """Тест что сценарии проходят без ошибок и укладываются в бюджет запросов"""
+        for name, scenario in SCENARIOS.items():
+            with self.subTest(name):
+                report = run_scenario(scenario(), self.data, requests=5)
+                self.assertEqual(report['requests'], 5)
+                self.assertEqual(report['errors'], 0)
+                if name in QUERY_BUDGETS:
+                    self.assertLessEqual(report['queries_per_request'], QUERY_BUDGETS[name])
+
+    def test_percentile(self):
+        """Тест вычисления перцентилей"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_loadtest_command_saves_results(self):
+        """Тест что команда сохраняет результаты в JSON и убирает за собой данные"""
+        clear_seed()
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'results.json'
+            call_command('loadtest', 'redeem', '--requests', '3', '--concurrency', '1', '--users', '2',
+                         '--output', str(output), stdout=StringIO())
+            results = json.loads(output.read_text())
+
+            out = StringIO()
+            call_command('loadtest', 'redeem', '--requests', '3', '--concurrency', '1', '--users', '2',
+                         '--compare', str(output), stdout=out)
+
+        self.assertEqual([report['scenario'] for report in results['results']], ['redeem'])
+        self.assertEqual(set(results['results'][0]['latency_ms']), {'p50', 'p95', 'p99', 'max'})
+        self.assertIn('req/s', out.getvalue())
+        self.assertFalse(User.objects.filter(email__startswith='loadtest-').exists())
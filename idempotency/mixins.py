@@ -0,0 +1,77 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+from .services import KeyReused, RequestInProgress, claim_key, release_key, request_fingerprint, store_response
+
+HEADER = 'Idempotency-Key'
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed.'
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used with a different request.'
+
+
+class _Replay(Exception):
+    def __init__(self, record):
+        self.record = record
+
+
+class IdempotentMixin:
+    """
+    Makes unsafe methods of an APIView safe to retry. The first response to a request
+    with an ``Idempotency-Key`` header is stored for IDEMPOTENCY_KEY_TTL seconds and
+    returned again, without running the view, for every retry with the same key.
+    Server errors are not stored, so their retries run the view again.
+    """
+    idempotent_methods = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+    idempotency_record = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        key = request.headers.get(HEADER)
+        if not key or request.method not in self.idempotent_methods:
+            return
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            raise ValidationError({HEADER: ['Ensure this value has at most 255 characters.']})
+
+        fingerprint = request_fingerprint(request.method, request.path, request.data)
+        try:
+            record, replay = claim_key(request.user, key, fingerprint)
+        except KeyReused:
+            raise IdempotencyKeyMismatch
+        except RequestInProgress:
+            raise IdempotencyConflict
+        if replay:
+            raise _Replay(record)
+        self.idempotency_record = record
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _Replay):
+            response = Response(exc.record.response_body, status=exc.record.status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            if self.idempotency_record is not None:
+                release_key(self.idempotency_record)
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        record = self.idempotency_record
+        if record is not None:
+            self.idempotency_record = None
+            if response.status_code >= 500:
+                release_key(record)
+            else:
+                store_response(record, response.status_code, response.data)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import models
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=255)
+    # sha256 of method, path and body, so a reused key with another request is refused
+    fingerprint = models.CharField(max_length=64)
+    # Both stay empty while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=JSONEncoder)
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_user_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user})"
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+# A first request that stored nothing for this long is treated as crashed and may be retried
+IN_PROGRESS_TIMEOUT = timedelta(seconds=60)
+# Share of new keys that also delete a chunk of expired ones
+PRUNE_PROBABILITY = 0.01
+PRUNE_CHUNK_SIZE = 500
+
+
+class KeyReused(Exception):
+    pass
+
+
+class RequestInProgress(Exception):
+    pass
+
+
+def request_fingerprint(method, path, data):
+    payload = json.dumps([method, path, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def claim_key(user, key, fingerprint):
+    """
+    Stores ``key`` for ``user`` with one INSERT on the unique (user, key) index.
+    Returns (record, replay): replay is True when the record already holds the
+    response of an earlier request. Raises KeyReused when the key came with a
+    different request and RequestInProgress while the first request still runs.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user, key=key, fingerprint=fingerprint, created_at=now, expires_at=expires_at
+            )
+    except IntegrityError:
+        record = IdempotencyKey.objects.get(user=user, key=key)
+    else:
+        if random.random() < PRUNE_PROBABILITY:
+            prune_expired()
+        return record, False
+
+    if record.expires_at <= now or (record.status_code is None and record.created_at <= now - IN_PROGRESS_TIMEOUT):
+        # Conditional on the old created_at, so only one retry takes over the key.
+        taken = IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).update(
+            fingerprint=fingerprint, status_code=None, response_body=None, created_at=now, expires_at=expires_at
+        )
+        record.refresh_from_db()
+        if taken:
+            return record, False
+
+    if record.fingerprint != fingerprint:
+        raise KeyReused(key)
+    if record.status_code is None:
+        raise RequestInProgress(key)
+    return record, True
+
+
+def store_response(record, status_code, body):
+    record.status_code = status_code
+    record.response_body = body
+    record.save(update_fields=['status_code', 'response_body'])
+
+
+def release_key(record):
+    """Forgets a claim whose request failed on the server, so a retry runs it again."""
+    IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+
+
+def prune_expired(chunk_size=PRUNE_CHUNK_SIZE):
+    """Deletes up to ``chunk_size`` expired keys through the expires_at index. Returns the number deleted."""
+    expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at')
+    deleted, _ = IdempotencyKey.objects.filter(pk__in=list(expired.values_list('pk', flat=True)[:chunk_size])).delete()
+    return deleted
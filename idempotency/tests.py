@@ -0,0 +1,90 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+from datetime import timedelta
+from partners.models import Partner, CouponCategory, CouponTemplate
+from rewards.models import UserCoupon
+from steps_tracking.models import DailyActivity
+from .models import IdempotencyKey
+from .services import prune_expired
+
+User = get_user_model()
+
+
+class IdempotencyKeyTest(TestCase):
+    """Тесты для повторных запросов с заголовком Idempotency-Key"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(identifier='user@example.com', password='testpass123', coins=100)
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        partner = Partner.objects.create(
+            user=User.objects.create_user(identifier='partner@example.com', is_partner=True),
+            name='Test Partner'
+        )
+        category = CouponCategory.objects.create(name='Food', slug='food')
+        self.template = CouponTemplate.objects.create(
+            partner=partner, category=category, title='Test Coupon', cost_coins=30
+        )
+        self.buy_url = reverse('buy_coupon', kwargs={'template_id': self.template.id})
+
+    def test_retried_buy_charges_once(self):
+        """Тест что повторная покупка с тем же ключом не списывает коины дважды"""
+        first = self.client.post(self.buy_url, HTTP_IDEMPOTENCY_KEY='buy-1')
+        retry = self.client.post(self.buy_url, HTTP_IDEMPOTENCY_KEY='buy-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['id'], first.data['id'])
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 70)
+        self.assertEqual(UserCoupon.objects.filter(user=self.user).count(), 1)
+
+        self.client.post(self.buy_url, HTTP_IDEMPOTENCY_KEY='buy-2')
+        self.assertEqual(UserCoupon.objects.filter(user=self.user).count(), 2)
+
+    def test_retried_activity_is_replayed(self):
+        """Тест что повторная отправка активности возвращает первый ответ"""
+        data = {'date': timezone.now().isoformat(), 'steps': 8000}
+        url = reverse('daily_activity_list_create')
+        first = self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='activity-1')
+        retry = self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='activity-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(DailyActivity.objects.filter(user=self.user).count(), 1)
+
+    def test_key_reused_with_other_request(self):
+        """Тест что ключ нельзя использовать для другого запроса"""
+        self.client.post(self.buy_url, HTTP_IDEMPOTENCY_KEY='key')
+        response = self.client.post(
+            reverse('daily_activity_list_create'), {'steps': 100}, format='json', HTTP_IDEMPOTENCY_KEY='key'
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_request_in_progress(self):
+        """Тест что параллельный повтор получает 409, а зависший запрос можно повторить"""
+        self.client.post(self.buy_url, HTTP_IDEMPOTENCY_KEY='key')
+        IdempotencyKey.objects.update(status_code=None, response_body=None)
+        response = self.client.post(self.buy_url, HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        response = self.client.post(self.buy_url, HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+
+    def test_expired_keys_are_pruned(self):
+        """Тест что просроченные ключи удаляются"""
+        self.client.post(self.buy_url, HTTP_IDEMPOTENCY_KEY='old')
+        self.client.post(self.buy_url, HTTP_IDEMPOTENCY_KEY='new')
+        IdempotencyKey.objects.filter(key='old').update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(prune_expired(), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
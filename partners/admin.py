@@ -1,6 +1,11 @@
 from django.contrib import admin
-from .models import Partner,CouponCategory,CouponTemplate
+from .models import Partner,CouponCategory,CouponTemplate,CouponStockShard,PartnerStats,PartnerDailyStats,CatalogSnapshot,CouponRanking
 
 admin.site.register(Partner)
 admin.site.register(CouponCategory)
 admin.site.register(CouponTemplate)
+admin.site.register(CouponStockShard)
+admin.site.register(PartnerStats)
+admin.site.register(PartnerDailyStats)
+admin.site.register(CatalogSnapshot)
+admin.site.register(CouponRanking)
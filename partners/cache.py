@@ -0,0 +1,64 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'marketplace:version'
+COUNTER_KEYS = {
+    'hits': 'marketplace:hits',
+    'misses': 'marketplace:misses',
+}
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock, so a lost counter never comes back to a number old pages were stored under.
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Makes every cached marketplace page unreachable with one increment; they expire on their own."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        catalog_version()
+
+
+def count(name):
+    key = COUNTER_KEYS[name]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def page_key(request):
+    query = '&'.join(sorted(request.META.get('QUERY_STRING', '').split('&')))
+    digest = hashlib.sha1(f'{request.get_host()}?{query}'.encode()).hexdigest()
+    return f'marketplace:page:{catalog_version()}:{digest}'
+
+
+def get_page(request):
+    key = page_key(request)
+    page = cache.get(key)
+    count('misses' if page is None else 'hits')
+    return key, page
+
+
+def store_page(key, data):
+    cache.set(key, data, settings.MARKETPLACE_CACHE_TTL)
+
+
+def cache_metrics():
+    hits, misses = (cache.get(key, 0) for key in COUNTER_KEYS.values())
+    return {
+        'version': cache.get(VERSION_KEY),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+    }
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from partners.snapshot import build_snapshot
+
+
+class Command(BaseCommand):
+    help = "Builds the compressed catalog snapshot served to apps at startup."
+
+    def handle(self, *args, **options):
+        snapshot = build_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot {snapshot.etag[:12]}: {len(snapshot.body)} bytes, {snapshot.raw_size} uncompressed."
+        ))
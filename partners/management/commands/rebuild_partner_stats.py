@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from partners.models import Partner
+from partners.stats import rebuild_partner_stats
+
+
+class Command(BaseCommand):
+    help = "Recomputes the dashboard totals and daily sales/redemption series of partners from their coupons."
+
+    def add_arguments(self, parser):
+        parser.add_argument('partner_ids', nargs='*', type=int, help="Defaults to every partner.")
+
+    def handle(self, *args, **options):
+        partners = Partner.objects.order_by('pk')
+        if options['partner_ids']:
+            partners = partners.filter(pk__in=options['partner_ids'])
+        for partner_id in partners.values_list('pk', flat=True).iterator():
+            stats = rebuild_partner_stats(partner_id)
+            self.stdout.write(f"Partner {partner_id}: {stats.sold} sold, {stats.redeemed} redeemed")
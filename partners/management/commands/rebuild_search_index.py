@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from partners.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the marketplace search index from all coupon templates."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the {type(backend).__name__} index."))
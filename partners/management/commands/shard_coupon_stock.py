@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from partners.models import CouponTemplate
+from partners.stock import reshard, sync_shards
+
+
+class Command(BaseCommand):
+    help = ("Spreads the stock of hot coupon templates over several counter rows, "
+            "or folds shard sales back into the templates with --sync.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('template_ids', nargs='*', type=int)
+        parser.add_argument('--shards', type=int, help="Number of stock shards, 0 turns sharding off.")
+        parser.add_argument('--sync', action='store_true', help="Refresh quantity and purchased_count of sharded templates.")
+
+    def handle(self, *args, **options):
+        if options['sync']:
+            templates = CouponTemplate.objects.filter(stock_shards__gt=0)
+            if options['template_ids']:
+                templates = templates.filter(pk__in=options['template_ids'])
+            for template in templates:
+                template = sync_shards(template)
+                self.stdout.write(f"{template.title}: {template.quantity} left, {template.purchased_count} sold")
+            return
+
+        if options['shards'] is None or not options['template_ids']:
+            raise CommandError("Pass template ids and --shards, or --sync.")
+
+        for template in CouponTemplate.objects.filter(pk__in=options['template_ids']):
+            template = reshard(template, options['shards'])
+            self.stdout.write(f"{template.title}: {template.stock_shards} shards")
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partners', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupontemplate',
+            name='stock_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='CouponStockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='partners.coupontemplate')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('template', 'index'), name='unique_template_stock_shard')],
+            },
+        ),
+    ]
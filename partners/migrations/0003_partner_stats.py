@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partners', '0002_coupon_stock_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartnerStats',
+            fields=[
+                ('partner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='partners.partner')),
+                ('active_templates', models.PositiveIntegerField(default=0)),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('revenue_coins', models.BigIntegerField(default=0)),
+                ('redeemed', models.PositiveIntegerField(default=0)),
+                ('rebuilt_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PartnerDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('revenue_coins', models.BigIntegerField(default=0)),
+                ('redeemed', models.PositiveIntegerField(default=0)),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='partners.partner')),
+            ],
+            options={
+                'ordering': ['day'],
+                'constraints': [models.UniqueConstraint(fields=('partner', 'day'), name='unique_partner_daily_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS partners_coupon_search USING fts5("
+        "title, description, partner_name, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO partners_coupon_search (rowid, title, description, partner_name) "
+        "SELECT t.id, t.title, t.description, p.name FROM partners_coupontemplate t "
+        "JOIN partners_partner p ON p.id = t.partner_id"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS partners_coupon_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partners', '0003_partner_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
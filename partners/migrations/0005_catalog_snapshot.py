@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partners', '0004_coupon_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('etag', models.CharField(max_length=64, unique=True)),
+                ('body', models.BinaryField()),
+                ('raw_size', models.PositiveIntegerField()),
+                ('built_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
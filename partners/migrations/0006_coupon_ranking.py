@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partners', '0005_catalog_snapshot'),
+        ('users', '0003_customuser_time_zone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CouponRanking',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='coupon_ranking', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('template_ids', models.BinaryField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partners', '0006_coupon_ranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CouponSearchEntry',
+            fields=[
+                ('template', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='partners.coupontemplate')),
+                ('document', models.TextField(db_column='partners_coupon_search')),
+            ],
+            options={
+                'db_table': 'partners_coupon_search',
+                'managed': False,
+            },
+        ),
+    ]
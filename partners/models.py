@@ -23,6 +23,9 @@ class Partner(models.Model):
     def __str__(self):
         return self.name
 
+STATS_TRACKED_FIELDS = ['partner_id', 'is_active']
+
+
 class CouponTemplate(models.Model):
     partner = models.ForeignKey(Partner, on_delete=models.CASCADE, related_name='coupons')
     category = models.ForeignKey(CouponCategory, on_delete=models.CASCADE, related_name='coupons')
@@ -33,10 +36,114 @@ class CouponTemplate(models.Model):
     validity_days = models.PositiveIntegerField(default=30)
     quantity = models.PositiveIntegerField(null=True, blank=True)
     purchased_count = models.PositiveIntegerField(default=0)
+    # Hot templates spread their stock over this many CouponStockShard rows, 0 keeps it on the template
+    stock_shards = models.PositiveSmallIntegerField(default=0)
 
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so signals can keep PartnerStats.active_templates up to date
+        if all(field in instance.__dict__ for field in STATS_TRACKED_FIELDS):
+            instance._loaded_values = instance.tracked_values()
+        return instance
+
+    def tracked_values(self):
+        return {field: getattr(self, field) for field in STATS_TRACKED_FIELDS}
+
     def __str__(self):
         return f"{self.title} - {self.partner.name}"
 
+
+
+class CouponSearchEntry(models.Model):
+    """A row of the SQLite full-text index kept by partners.search, mapped so searches can join it."""
+    template = models.OneToOneField(
+        CouponTemplate,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        related_name='search_entry'
+    )
+    # FTS5 matches against a hidden column named after the table
+    document = models.TextField(db_column='partners_coupon_search')
+
+    class Meta:
+        managed = False
+        db_table = 'partners_coupon_search'
+
+
+class CouponStockShard(models.Model):
+    template = models.ForeignKey(CouponTemplate, on_delete=models.CASCADE, related_name='shards')
+    index = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+    sold = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['template', 'index'], name='unique_template_stock_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.template.title} #{self.index}: {self.quantity} left"
+
+
+
+class PartnerStats(models.Model):
+    partner = models.OneToOneField(Partner, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    active_templates = models.PositiveIntegerField(default=0)
+    sold = models.PositiveIntegerField(default=0)
+    revenue_coins = models.BigIntegerField(default=0)
+    redeemed = models.PositiveIntegerField(default=0)
+    rebuilt_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.partner.name}: {self.sold} sold, {self.redeemed} redeemed"
+
+
+class PartnerDailyStats(models.Model):
+    partner = models.ForeignKey(Partner, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    sold = models.PositiveIntegerField(default=0)
+    revenue_coins = models.BigIntegerField(default=0)
+    redeemed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['partner', 'day'], name='unique_partner_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.partner.name} on {self.day}: {self.sold} sold, {self.redeemed} redeemed"
+
+
+
+class CatalogSnapshot(models.Model):
+    # sha256 of the uncompressed JSON, so identical catalogs share an ETag
+    etag = models.CharField(max_length=64, unique=True)
+    body = models.BinaryField()
+    raw_size = models.PositiveIntegerField()
+    built_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Catalog snapshot {self.etag[:12]} ({len(self.body)} of {self.raw_size} bytes)"
+
+
+
+class CouponRanking(models.Model):
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='coupon_ranking'
+    )
+    # Template ids, best first, packed as little-endian uint32 by partners.ranking
+    template_ids = models.BinaryField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Coupon ranking of {self.user} ({len(self.template_ids) // 4} templates)"
@@ -0,0 +1,186 @@
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.utils import timezone
+from rest_framework.filters import BaseFilterBackend
+
+from rewards.models import UserCoupon
+from .models import CouponRanking, CouponTemplate
+from .stock import with_live_stock
+
+User = get_user_model()
+
+RANKING_SIZE = 200
+# Scored cells per batch (users x templates), bounds the memory of one scoring run
+MAX_BATCH_CELLS = 20_000_000
+RANKING_DTYPE = np.dtype('<u4')
+WEIGHTS = {
+    'category': 3.0,
+    'partner': 1.5,
+    'popularity': 1.0,
+    'affordable': 2.0,
+    'shortfall': 2.0,
+}
+
+
+def pack_ids(ids):
+    return np.asarray(ids, dtype=RANKING_DTYPE).tobytes()
+
+
+def unpack_ids(packed):
+    return np.frombuffer(bytes(packed), dtype=RANKING_DTYPE).tolist()
+
+
+class Catalog:
+    """Active templates as parallel arrays, with categories and partners mapped to column indexes."""
+
+    def __init__(self):
+        rows = list(
+            with_live_stock(CouponTemplate.objects.filter(is_active=True, partner__is_active=True))
+            .order_by('pk')
+            .values_list('pk', 'category_id', 'partner_id', 'cost_coins', 'live_purchased_count')
+        )
+        columns = np.array(rows, dtype=np.int64).reshape(-1, 5)
+        self.ids = columns[:, 0]
+        self.category_ids, self.category_index = np.unique(columns[:, 1], return_inverse=True)
+        self.partner_ids, self.partner_index = np.unique(columns[:, 2], return_inverse=True)
+        self.cost = columns[:, 3].astype(np.float32)
+        purchases = np.log1p(columns[:, 4].astype(np.float32))
+        self.popularity = purchases / purchases.max() if len(purchases) and purchases.max() > 0 else purchases
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def affinities(user_ids, catalog):
+    """
+    Each user's share of past purchases per catalog category and per catalog partner,
+    as (users x categories) and (users x partners) matrices. Purchases of templates
+    that left the marketplace still count towards their category and partner.
+    ``catalog`` must not be empty.
+    """
+    user_index = {user_id: row for row, user_id in enumerate(user_ids)}
+    history = np.array(
+        list(
+            UserCoupon.objects.filter(user_id__in=user_ids)
+            .values('user_id', 'template__category_id', 'template__partner_id')
+            .annotate(count=models.Count('pk'))
+            .values_list('user_id', 'template__category_id', 'template__partner_id', 'count')
+            .order_by()
+        ),
+        dtype=np.int64
+    ).reshape(-1, 4)
+
+    category = np.zeros((len(user_ids), len(catalog.category_ids)), dtype=np.float32)
+    partner = np.zeros((len(user_ids), len(catalog.partner_ids)), dtype=np.float32)
+    totals = np.zeros(len(user_ids), dtype=np.float32)
+    if len(history):
+        rows = np.array([user_index[user_id] for user_id in history[:, 0]])
+        counts = history[:, 3].astype(np.float32)
+        np.add.at(totals, rows, counts)
+        for matrix, known_ids, values in ((category, catalog.category_ids, history[:, 1]),
+                                          (partner, catalog.partner_ids, history[:, 2])):
+            columns = np.minimum(np.searchsorted(known_ids, values), len(known_ids) - 1)
+            listed = known_ids[columns] == values
+            np.add.at(matrix, (rows[listed], columns[listed]), counts[listed])
+
+    shares = np.divide(1.0, totals, out=np.zeros_like(totals), where=totals > 0)[:, None]
+    return category * shares, partner * shares
+
+
+def score(coins, category_affinity, partner_affinity, catalog):
+    """(users x templates) scores: taste for the category and partner, popularity, and whether the user can pay."""
+    coins = coins.astype(np.float32)[:, None]
+    cost = catalog.cost[None, :]
+    shortfall = np.clip((cost - coins) / np.maximum(cost, 1.0), 0.0, 1.0)
+    return (
+        WEIGHTS['category'] * category_affinity[:, catalog.category_index]
+        + WEIGHTS['partner'] * partner_affinity[:, catalog.partner_index]
+        + WEIGHTS['popularity'] * catalog.popularity[None, :]
+        + WEIGHTS['affordable'] * (cost <= coins)
+        - WEIGHTS['shortfall'] * shortfall
+    )
+
+
+def top_templates(scores, catalog, size=RANKING_SIZE):
+    """Template ids of the ``size`` best scores per row, best first; ties keep the older template first."""
+    size = min(size, scores.shape[1])
+    if size < scores.shape[1]:
+        candidates = np.argpartition(-scores, size - 1, axis=1)[:, :size]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    picked = np.take_along_axis(scores, candidates, axis=1)
+    order = np.lexsort((candidates, -picked), axis=1)
+    return catalog.ids[np.take_along_axis(candidates, order, axis=1)]
+
+
+def rank_users(user_ids=None, size=RANKING_SIZE):
+    """
+    Scores every active template for ``user_ids`` (default: all active users) in
+    batches of users and stores each user's top ``size`` template ids. Returns the
+    number of users ranked.
+    """
+    catalog = Catalog()
+    users = User.objects.filter(is_active=True).order_by('pk')
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    batch_size = max(1, MAX_BATCH_CELLS // max(len(catalog), 1))
+
+    ranked = 0
+    batch = []
+    for row in users.values_list('pk', 'coins').iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            ranked += store_rankings(batch, catalog, size)
+            batch = []
+    if batch:
+        ranked += store_rankings(batch, catalog, size)
+    return ranked
+
+
+def store_rankings(batch, catalog, size):
+    user_ids = [user_id for user_id, _ in batch]
+    coins = np.array([user_coins for _, user_coins in batch], dtype=np.int64)
+    if len(catalog):
+        category_affinity, partner_affinity = affinities(user_ids, catalog)
+        rankings = top_templates(score(coins, category_affinity, partner_affinity, catalog), catalog, size)
+    else:
+        rankings = np.zeros((len(user_ids), 0), dtype=np.int64)
+
+    now = timezone.now()
+    CouponRanking.objects.bulk_create(
+        [
+            CouponRanking(user_id=user_id, template_ids=pack_ids(ranking), computed_at=now)
+            for user_id, ranking in zip(user_ids, rankings)
+        ],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['template_ids', 'computed_at']
+    )
+    return len(user_ids)
+
+
+class RecommendedOrderingFilter(BaseFilterBackend):
+    """
+    ``?ordering=recommended`` puts the user's precomputed ranking first; templates
+    added since the last ranking run follow, newest first. Expects a queryset from with_live_stock.
+    """
+    ordering_param = 'ordering'
+    ordering_value = 'recommended'
+
+    def filter_queryset(self, request, queryset, view):
+        if request.query_params.get(self.ordering_param) != self.ordering_value:
+            return queryset
+
+        packed = CouponRanking.objects.filter(user=request.user).values_list('template_ids', flat=True).first()
+        ranked = unpack_ids(packed) if packed else []
+        if not ranked:
+            return queryset.order_by('-live_purchased_count', '-created_at')
+        return queryset.order_by(
+            models.Case(
+                *[models.When(pk=pk, then=position) for position, pk in enumerate(ranked)],
+                default=len(ranked),
+                output_field=models.IntegerField()
+            ),
+            '-created_at'
+        )
@@ -0,0 +1,125 @@
+import re
+
+from django.conf import settings
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+
+from .models import CouponSearchEntry
+
+FTS_TABLE = 'partners_coupon_search'
+# Title matches weigh most, then the partner name, then the description
+FTS_WEIGHTS = (10.0, 1.0, 5.0)
+SEARCH_PARAM = 'search'
+
+
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+CouponSearchEntry._meta.get_field('document').register_lookup(Match)
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+class SearchBackend:
+    """Narrows a template queryset to a query, best match first, and keeps its index in sync."""
+
+    def index(self, template_ids):
+        pass
+
+    def remove(self, template_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, queryset, terms):
+        raise NotImplementedError
+
+
+class SqliteFTSBackend(SearchBackend):
+    """
+    An FTS5 table keyed by template id holds title, description and partner name.
+    Every term matches as a prefix and results are ranked with bm25.
+    """
+
+    INSERT_ROWS = (
+        f"INSERT INTO {FTS_TABLE} (rowid, title, description, partner_name) "
+        "SELECT t.id, t.title, t.description, p.name FROM partners_coupontemplate t "
+        "JOIN partners_partner p ON p.id = t.partner_id"
+    )
+
+    def index(self, template_ids):
+        template_ids = list(template_ids)
+        if not template_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(template_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", template_ids)
+            cursor.execute(f"{self.INSERT_ROWS} WHERE t.id IN ({placeholders})", template_ids)
+
+    def remove(self, template_ids):
+        template_ids = list(template_ids)
+        if template_ids:
+            placeholders = ', '.join(['%s'] * len(template_ids))
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", template_ids)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(self.INSERT_ROWS)
+
+    def search(self, queryset, terms):
+        # One MATCH drives the query and joins the caller's conditions, so inactive matches never crowd out
+        # active ones and bm25 is computed once per matching row.
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        return queryset.filter(search_entry__document__match=match).annotate(
+            search_rank=RawSQL(f"bm25({FTS_TABLE}, {weights})", [], output_field=models.FloatField())
+        ).order_by('search_rank', '-pk')
+
+
+class LikeSearchBackend(SearchBackend):
+    """Needs no index: every term must occur in one of the fields, title matches come first."""
+
+    def search(self, queryset, terms):
+        templates = queryset
+        title_hits = models.Value(0)
+        for term in terms:
+            templates = templates.filter(
+                models.Q(title__icontains=term)
+                | models.Q(description__icontains=term)
+                | models.Q(partner__name__icontains=term)
+            )
+            title_hits = title_hits + models.Case(
+                models.When(title__icontains=term, then=1), default=0, output_field=models.IntegerField()
+            )
+        return templates.annotate(title_hits=title_hits).order_by('-title_hits', '-pk')
+
+
+def get_search_backend():
+    path = settings.MARKETPLACE_SEARCH_BACKEND
+    if path == 'auto':
+        return SqliteFTSBackend() if connection.vendor == 'sqlite' else LikeSearchBackend()
+    return import_string(path)()
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """``?search=`` through the configured backend, keeping the backend's ranking unless ``?ordering=`` overrides it."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = search_terms(request.query_params.get(SEARCH_PARAM, ''))
+        if not terms:
+            return queryset
+
+        return get_search_backend().search(queryset, terms)
@@ -44,4 +44,12 @@ class CouponTemplateSerializer(serializers.ModelSerializer):
             'is_active',
             'created_at'
         ]
-        read_only_fields = ['partner_details', 'purchased_count', 'created_at']
\ No newline at end of file
+        read_only_fields = ['partner_details', 'purchased_count', 'created_at']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Querysets from partners.stock.with_live_stock carry the stock of sharded templates
+        for field in ('quantity', 'purchased_count'):
+            if hasattr(instance, f'live_{field}'):
+                data[field] = getattr(instance, f'live_{field}')
+        return data
\ No newline at end of file
@@ -0,0 +1,57 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .models import CouponCategory, CouponTemplate, Partner, STATS_TRACKED_FIELDS
+from .search import get_search_backend
+from .snapshot import schedule_snapshot
+from .stats import active_template_deltas, apply_active_template_deltas
+
+# Stock and counter saves leave the search index alone
+SEARCHABLE_TEMPLATE_FIELDS = {'title', 'description', 'partner', 'partner_id'}
+STOCK_FIELDS = {'quantity', 'purchased_count', 'stock_shards'}
+
+
+@receiver(pre_save, sender=CouponTemplate)
+def remember_previous_values(sender, instance, **kwargs):
+    if instance._state.adding or hasattr(instance, '_loaded_values'):
+        return
+    instance._loaded_values = CouponTemplate.objects.filter(pk=instance.pk).values(*STATS_TRACKED_FIELDS).first()
+
+
+@receiver(post_save, sender=CouponTemplate)
+def update_active_templates(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_loaded_values', None)
+    instance._loaded_values = instance.tracked_values()
+    apply_active_template_deltas(active_template_deltas(previous, instance._loaded_values))
+
+
+@receiver(post_save, sender=CouponTemplate)
+def index_template(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCHABLE_TEMPLATE_FIELDS & set(update_fields):
+        get_search_backend().index([instance.pk])
+
+
+@receiver(post_delete, sender=CouponTemplate)
+def subtract_deleted_template(sender, instance, **kwargs):
+    apply_active_template_deltas(active_template_deltas(instance.tracked_values(), None))
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Partner)
+def reindex_partner_templates(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'name' in update_fields):
+        get_search_backend().index(instance.coupons.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=CouponTemplate)
+@receiver(post_delete, sender=CouponTemplate)
+@receiver(post_save, sender=Partner)
+@receiver(post_delete, sender=Partner)
+@receiver(post_save, sender=CouponCategory)
+@receiver(post_delete, sender=CouponCategory)
+def catalog_changed(sender, update_fields=None, **kwargs):
+    bump_catalog_version()
+    # The snapshot leaves stock counters out
+    if not update_fields or not set(update_fields) <= STOCK_FIELDS:
+        schedule_snapshot()
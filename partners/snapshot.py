@@ -0,0 +1,100 @@
+import gzip
+import hashlib
+import json
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from .models import CatalogSnapshot, CouponCategory, CouponTemplate, Partner
+
+# Older snapshots are kept briefly for requests that already read their id
+KEEP_SNAPSHOTS = 3
+TEMPLATE_FIELDS = ['id', 'partner_id', 'category_id', 'title', 'description', 'cost_coins', 'validity_days',
+                   'created_at']
+
+
+def media_url(name):
+    return default_storage.url(name) if name else None
+
+
+def catalog_document():
+    """
+    The active catalog with every partner, category and template listed once, keyed by id.
+    Stock counters are left out: they change with every purchase, the marketplace serves them live.
+    """
+    templates = {
+        row['id']: row
+        for row in CouponTemplate.objects.filter(is_active=True, partner__is_active=True)
+        .order_by('id').values(*TEMPLATE_FIELDS)
+    }
+    partner_ids = {row['partner_id'] for row in templates.values()}
+    category_ids = {row['category_id'] for row in templates.values()}
+
+    partners = {
+        row['id']: {**row, 'logo': media_url(row['logo'])}
+        for row in Partner.objects.filter(pk__in=partner_ids).order_by('id')
+        .values('id', 'name', 'description', 'logo', 'website')
+    }
+    categories = {
+        row['id']: {**row, 'icon': media_url(row['icon'])}
+        for row in CouponCategory.objects.filter(pk__in=category_ids).order_by('id').values('id', 'name', 'slug', 'icon')
+    }
+    for row in templates.values():
+        row['partner'] = row.pop('partner_id')
+        row['category'] = row.pop('category_id')
+    return {'partners': partners, 'categories': categories, 'templates': templates}
+
+
+def build_snapshot():
+    """Stores the current catalog gzip-compressed unless the latest snapshot already holds it."""
+    raw = json.dumps(catalog_document(), cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    etag = hashlib.sha256(raw).hexdigest()
+
+    latest = CatalogSnapshot.objects.order_by('-pk').only('pk', 'etag').first()
+    if latest and latest.etag == etag:
+        return latest
+
+    with transaction.atomic():
+        # A catalog that changed back to an older state reuses its row and becomes the latest again.
+        CatalogSnapshot.objects.filter(etag=etag).delete()
+        snapshot = CatalogSnapshot.objects.create(
+            etag=etag,
+            body=gzip.compress(raw, compresslevel=9, mtime=0),
+            raw_size=len(raw)
+        )
+        stale = CatalogSnapshot.objects.order_by('-pk').values_list('pk', flat=True)[KEEP_SNAPSHOTS:]
+        CatalogSnapshot.objects.filter(pk__in=list(stale)).delete()
+    return snapshot
+
+
+def schedule_snapshot():
+    """Rebuilds the snapshot once the current transaction commits, once however many rows it changed."""
+    if not any(func is build_snapshot for _, func, _ in connection.run_on_commit):
+        transaction.on_commit(build_snapshot)
+
+
+class SnapshotBodies:
+    """Keeps the body of the latest snapshot in memory, so a request only reads its id and ETag."""
+
+    def __init__(self):
+        self.entry = (None, None)
+
+    def get(self, pk):
+        cached_pk, body = self.entry
+        if pk != cached_pk:
+            body = bytes(CatalogSnapshot.objects.values_list('body', flat=True).get(pk=pk))
+            self.entry = (pk, body)
+        return body
+
+
+snapshot_bodies = SnapshotBodies()
+
+
+def latest_snapshot():
+    """(pk, etag) of the newest snapshot, building the first one on demand."""
+    latest = CatalogSnapshot.objects.order_by('-pk').values_list('pk', 'etag').first()
+    if latest is None:
+        snapshot = build_snapshot()
+        latest = (snapshot.pk, snapshot.etag)
+    return latest
@@ -0,0 +1,126 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from rewards.models import UserCoupon
+from .models import CouponTemplate, PartnerDailyStats, PartnerStats
+
+STATS_FIELDS = ['sold', 'revenue_coins', 'redeemed']
+
+
+def bump_stats(partner_id, day_deltas):
+    """
+    Adds per-day ``{day: {field: delta}}`` changes to a partner's totals and daily rows.
+    Partners whose stats were never built are skipped: building them later
+    aggregates everything, including this change.
+    """
+    totals = Counter()
+    for deltas in day_deltas.values():
+        totals.update(deltas)
+    if not PartnerStats.objects.filter(pk=partner_id).update(
+        **{field: models.F(field) + delta for field, delta in totals.items()}
+    ):
+        return
+
+    for day, deltas in day_deltas.items():
+        increments = {field: models.F(field) + delta for field, delta in deltas.items()}
+        if not PartnerDailyStats.objects.filter(partner_id=partner_id, day=day).update(**increments):
+            PartnerDailyStats.objects.bulk_create([PartnerDailyStats(partner_id=partner_id, day=day)], ignore_conflicts=True)
+            PartnerDailyStats.objects.filter(partner_id=partner_id, day=day).update(**increments)
+
+
+def record_sales(sales, moment=None):
+    """
+    ``sales`` holds (partner_id, coupons, coins) per partner of one purchase.
+    The counters change once the purchase committed, so concurrent buyers of one
+    partner never queue on its stats rows. A failure there is logged instead of failing
+    the purchase; rebuild_partner_stats repairs the counters.
+    """
+    day = timezone.localdate(moment)
+    sales = list(sales)
+
+    def apply():
+        with transaction.atomic():
+            for partner_id, count, coins in sales:
+                bump_stats(partner_id, {day: {'sold': count, 'revenue_coins': coins}})
+
+    transaction.on_commit(apply, robust=True)
+
+
+def record_redemptions(partner_id, moments):
+    days = Counter(timezone.localdate(moment) for moment in moments)
+    if days:
+        bump_stats(partner_id, {day: {'redeemed': count} for day, count in days.items()})
+
+
+def rebuild_partner_stats(partner_id):
+    """
+    Recomputes a partner's totals and daily series from the coupons it issued,
+    counting each at the price it was bought for, just as record_sales does.
+    """
+    coupons = UserCoupon.objects.filter(template__partner_id=partner_id).order_by()
+
+    with transaction.atomic():
+        active_templates = CouponTemplate.objects.filter(partner_id=partner_id, is_active=True).count()
+        daily = defaultdict(lambda: dict.fromkeys(STATS_FIELDS, 0))
+        for row in coupons.values(bucket=TruncDate('purchased_at')).annotate(
+            sold=models.Count('pk'),
+            revenue_coins=models.Sum(Coalesce('price_coins', 'template__cost_coins'))
+        ):
+            daily[row['bucket']].update(sold=row['sold'], revenue_coins=row['revenue_coins'])
+        for row in coupons.filter(is_redeemed=True).values(bucket=TruncDate('redeemed_at')).annotate(
+            redeemed=models.Count('pk')
+        ):
+            daily[row['bucket']]['redeemed'] = row['redeemed']
+
+        PartnerDailyStats.objects.filter(partner_id=partner_id).delete()
+        PartnerDailyStats.objects.bulk_create([
+            PartnerDailyStats(partner_id=partner_id, day=day, **values) for day, values in daily.items()
+        ])
+        stats, _ = PartnerStats.objects.update_or_create(
+            partner_id=partner_id,
+            defaults={
+                'active_templates': active_templates,
+                **{field: sum(values[field] for values in daily.values()) for field in STATS_FIELDS},
+                'rebuilt_at': timezone.now(),
+            }
+        )
+    return stats
+
+
+def get_partner_stats(partner_id):
+    """The stored totals, built on first use and whenever the row went missing."""
+    stats = PartnerStats.objects.filter(pk=partner_id).first()
+    return stats or rebuild_partner_stats(partner_id)
+
+
+def daily_series(partner_id, days):
+    """One entry per day of the last ``days`` days, oldest first, with zeros for quiet days."""
+    today = timezone.localdate()
+    first_day = today - timedelta(days=days - 1)
+    stored = {
+        row['day']: row
+        for row in PartnerDailyStats.objects.filter(partner_id=partner_id, day__gte=first_day)
+        .values('day', *STATS_FIELDS)
+    }
+    return [
+        stored.get(day, {'day': day, **dict.fromkeys(STATS_FIELDS, 0)})
+        for day in (first_day + timedelta(days=offset) for offset in range(days))
+    ]
+
+
+def active_template_deltas(previous, current):
+    """Per-partner change of active templates between two tracked value dicts; either may be None."""
+    deltas = Counter()
+    for values, sign in ((previous, -1), (current, 1)):
+        if values and values['is_active']:
+            deltas[values['partner_id']] += sign
+    return {partner_id: delta for partner_id, delta in deltas.items() if delta}
+
+
+def apply_active_template_deltas(deltas):
+    for partner_id, delta in deltas.items():
+        PartnerStats.objects.filter(pk=partner_id).update(active_templates=models.F('active_templates') + delta)
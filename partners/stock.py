@@ -0,0 +1,136 @@
+import random
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+
+from .models import CouponTemplate, CouponStockShard
+
+
+class OutOfStock(Exception):
+    pass
+
+
+def take_units(template, count=1):
+    """
+    Sells ``count`` units of ``template`` with conditional UPDATEs, so concurrent
+    buyers can never push the stock below zero. Raises OutOfStock.
+    Must run inside the caller's transaction, which also undoes partial shard takes.
+    """
+    if template.stock_shards and template.quantity is not None:
+        return take_units_from_shards(template, count)
+
+    updated = (
+        CouponTemplate.objects.filter(pk=template.pk, is_active=True)
+        .filter(models.Q(quantity__isnull=True) | models.Q(quantity__gte=count))
+        .update(quantity=models.F('quantity') - count, purchased_count=models.F('purchased_count') + count)
+    )
+    if not updated:
+        raise OutOfStock(template.pk)
+
+
+def take_units_from_shards(template, count):
+    # Buyers start on a random shard so they rarely wait on the same row lock.
+    shards = CouponStockShard.objects.filter(template=template)
+
+    def take(index, amount):
+        return shards.filter(index=index, quantity__gte=amount).update(
+            quantity=models.F('quantity') - amount,
+            sold=models.F('sold') + amount
+        )
+
+    first = random.randrange(template.stock_shards)
+    if take(first, count):
+        return
+
+    remaining = count
+    for index, available in shards.filter(quantity__gt=0).values_list('index', 'quantity'):
+        amount = min(available, remaining)
+        if take(index, amount):
+            remaining -= amount
+        if not remaining:
+            return
+    raise OutOfStock(template.pk)
+
+
+def return_units(template, count):
+    """Puts ``count`` units taken by take_units back on sale, for reservations that ran out."""
+    if template.stock_shards and template.quantity is not None:
+        return return_units_to_shards(template, count)
+
+    CouponTemplate.objects.filter(pk=template.pk).update(
+        quantity=models.F('quantity') + count,
+        purchased_count=models.F('purchased_count') - count
+    )
+
+
+def return_units_to_shards(template, count):
+    shards = CouponStockShard.objects.filter(template=template)
+    remaining = count
+    for index, sold in shards.filter(sold__gt=0).values_list('index', 'sold'):
+        amount = min(sold, remaining)
+        if shards.filter(index=index, sold__gte=amount).update(
+            quantity=models.F('quantity') + amount,
+            sold=models.F('sold') - amount
+        ):
+            remaining -= amount
+        if not remaining:
+            return
+
+    # Units sold before the last sync_shards are already counted on the template.
+    shards.filter(index=random.randrange(template.stock_shards)).update(quantity=models.F('quantity') + remaining)
+    CouponTemplate.objects.filter(pk=template.pk).update(purchased_count=models.F('purchased_count') - remaining)
+
+
+def with_live_stock(queryset):
+    """
+    Annotates templates with ``live_quantity`` and ``live_purchased_count``. Sharded
+    templates keep their sales on the shard rows until sync_shards folds them in,
+    so readers add the shards up instead of trusting the template's own counters.
+    """
+    shards = CouponStockShard.objects.filter(template=models.OuterRef('pk')).order_by().values('template')
+
+    def shard_total(field):
+        return models.Subquery(shards.annotate(total=models.Sum(field)).values('total'))
+
+    return queryset.annotate(
+        live_quantity=models.Case(
+            models.When(stock_shards__gt=0, then=shard_total('quantity')),
+            default=models.F('quantity')
+        ),
+        live_purchased_count=models.F('purchased_count') + Coalesce(shard_total('sold'), 0)
+    )
+
+
+def sync_shards(template):
+    """Folds shard sales into the template's quantity and purchased_count."""
+    with transaction.atomic():
+        template = CouponTemplate.objects.select_for_update().get(pk=template.pk)
+        shards = list(CouponStockShard.objects.select_for_update().filter(template=template))
+        if not shards:
+            return template
+
+        template.quantity = sum(shard.quantity for shard in shards)
+        template.purchased_count += sum(shard.sold for shard in shards)
+        template.save(update_fields=['quantity', 'purchased_count'])
+        CouponStockShard.objects.filter(pk__in=[shard.pk for shard in shards]).update(sold=0)
+    return template
+
+
+def reshard(template, shards):
+    """Spreads the remaining stock of ``template`` over ``shards`` rows; 0 moves it back onto the template."""
+    with transaction.atomic():
+        template = sync_shards(template)
+        CouponStockShard.objects.filter(template=template).delete()
+
+        if shards and template.quantity is not None:
+            per_shard, extra = divmod(template.quantity, shards)
+            CouponStockShard.objects.bulk_create([
+                CouponStockShard(template=template, index=index, quantity=per_shard + (index < extra))
+                for index in range(shards)
+            ])
+        else:
+            shards = 0
+
+        template.stock_shards = shards
+        template.save(update_fields=['stock_shards'])
+    return template
@@ -1,10 +1,25 @@
-from django.test import TestCase
+import gzip
+import json
+from django.test import TestCase, TransactionTestCase, override_settings
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection, transaction
+from rewards.models import UserCoupon
+from rewards.services import reserve_coupon
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Partner, CouponCategory, CouponTemplate
+from django.utils import timezone
+from .models import (Partner, CouponCategory, CouponTemplate, PartnerStats, PartnerDailyStats, CatalogSnapshot,
+                     CouponRanking)
+from .ranking import pack_ids, rank_users, unpack_ids
+from .search import get_search_backend
+from .snapshot import KEEP_SNAPSHOTS, build_snapshot
+from .stock import reshard, take_units
+from .views import CouponMarketplaceView
+from .stats import rebuild_partner_stats
 
 User = get_user_model()
 
@@ -146,6 +161,109 @@ class CouponMarketplaceTest(TestCase):
         coupon_titles = [c['title'] for c in response.data]
         self.assertNotIn('Inactive Coupon', coupon_titles)
 
+    def search(self, query):
+        response = self.client.get(self.marketplace_url, {'search': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [coupon['title'] for coupon in response.data]
+
+    def create_search_catalog(self):
+        coffee_house = Partner.objects.create(
+            user=User.objects.create_user(identifier='coffee@example.com', is_partner=True),
+            name='Coffee House'
+        )
+        CouponTemplate.objects.create(partner=coffee_house, category=self.category, title='Donut', cost_coins=5)
+        CouponTemplate.objects.create(
+            partner=self.partner, category=self.category, title='Free drink', description='Any coffee or tea',
+            cost_coins=10
+        )
+        CouponTemplate.objects.create(partner=self.partner, category=self.category, title='Coffee latte', cost_coins=20)
+        CouponTemplate.objects.create(partner=self.partner, category=self.category, title='Кофе с собой', cost_coins=15)
+        return coffee_house
+
+    def test_search_is_ranked(self):
+        """Тест что поиск находит купоны по префиксу и ставит совпадения в названии первыми"""
+        self.create_search_catalog()
+        titles = self.search('coff')
+        self.assertEqual(titles[0], 'Coffee latte')
+        self.assertEqual(set(titles), {'Coffee latte', 'Free drink', 'Donut'})
+        self.assertEqual(self.search('coffee latte'), ['Coffee latte'])
+        self.assertEqual(self.search('КОФЕ'), ['Кофе с собой'])
+        self.assertEqual(self.search('nothing'), [])
+        self.assertEqual(len(self.search('!!')), 5)
+
+    def test_search_index_follows_saves(self):
+        """Тест что индекс поиска обновляется при изменении купонов и партнеров"""
+        coffee_house = self.create_search_catalog()
+        self.coupon.title = 'Pizza slice'
+        self.coupon.save()
+        self.assertEqual(self.search('pizza'), ['Pizza slice'])
+        self.assertEqual(self.search('coupon'), [])
+
+        coffee_house.name = 'Bakery'
+        coffee_house.save()
+        self.assertEqual(self.search('bakery'), ['Donut'])
+
+        self.coupon.is_active = False
+        self.coupon.save(update_fields=['is_active'])
+        self.assertEqual(self.search('pizza'), [])
+        self.coupon.delete()
+        self.assertEqual(self.search('slice'), [])
+
+    def test_search_skips_inactive_matches(self):
+        """Тест что неактивные совпадения не вытесняют активные и результаты не обрезаются"""
+        CouponTemplate.objects.bulk_create(
+            [CouponTemplate(partner=self.partner, category=self.category, title=f'Pizza {i}', cost_coins=10,
+                            is_active=False) for i in range(120)]
+            + [CouponTemplate(partner=self.partner, category=self.category, title=f'Pizza deal {i}', cost_coins=10)
+               for i in range(105)]
+        )
+        get_search_backend().rebuild()
+        titles = self.search('pizza')
+        self.assertEqual(len(titles), 105)
+        self.assertTrue(all(title.startswith('Pizza deal') for title in titles))
+
+    def test_search_matches_once(self):
+        """Тест что поиск один раз обходит индекс и достаёт купоны по ключу"""
+        CouponTemplate.objects.bulk_create([
+            CouponTemplate(partner=self.partner, category=self.category, title=f'Coffee {i}', cost_coins=10)
+            for i in range(5000)
+        ])
+        get_search_backend().rebuild()
+        queryset = get_search_backend().search(CouponMarketplaceView.queryset, ['coffee'])
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        # The index is scanned once up front, never once per candidate row
+        self.assertEqual(len([step for step in plan if 'partners_coupon_search' in step]), 1, plan)
+        self.assertTrue(plan[0].startswith('SCAN partners_coupon_search VIRTUAL TABLE'), plan)
+        self.assertIn('SEARCH partners_coupontemplate USING INTEGER PRIMARY KEY (rowid=?)', plan)
+        self.assertEqual(len(self.search('coffee')), 5000)
+
+    @override_settings(MARKETPLACE_SEARCH_BACKEND='partners.search.LikeSearchBackend')
+    def test_search_without_full_text_index(self):
+        """Тест запасного поиска без полнотекстового индекса"""
+        self.create_search_catalog()
+        self.assertEqual(self.search('coffee')[0], 'Coffee latte')
+        self.assertEqual(set(self.search('coffee')), {'Coffee latte', 'Free drink', 'Donut'})
+
+    def test_marketplace_counts_sharded_sales(self):
+        """Тест что маркетплейс учитывает продажи из шардов запаса"""
+        CouponTemplate.objects.create(
+            partner=self.partner, category=self.category, title='Popular', cost_coins=5, purchased_count=2
+        )
+        self.coupon.quantity = 10
+        self.coupon.save(update_fields=['quantity'])
+        take_units(reshard(self.coupon, 3), 4)
+
+        coupons = self.client.get(self.marketplace_url).data
+        sharded = next(coupon for coupon in coupons if coupon['id'] == self.coupon.id)
+        self.assertEqual((sharded['quantity'], sharded['purchased_count']), (6, 4))
+
+        response = self.client.get(self.marketplace_url, {'ordering': 'recommended'})
+        self.assertEqual(response.data[0]['id'], self.coupon.id)
+
     def test_marketplace_requires_authentication(self):
         """Тест что маркетплейс требует аутентификации"""
         self.client.credentials()
@@ -153,6 +271,201 @@ class CouponMarketplaceTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class MarketplaceCacheTest(TestCase):
+    """Тесты для кеширования маркетплейса"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(identifier='user@example.com', password='testpass123', is_staff=True)
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        self.partner = Partner.objects.create(
+            user=User.objects.create_user(identifier='partner@example.com', is_partner=True),
+            name='Test Partner'
+        )
+        self.category = CouponCategory.objects.create(name='Food', slug='food')
+        self.coupon = CouponTemplate.objects.create(
+            partner=self.partner, category=self.category, title='Test Coupon', cost_coins=50
+        )
+        self.marketplace_url = reverse('marketplace')
+
+    def get(self, query=''):
+        return self.client.get(f'{self.marketplace_url}?{query}')
+
+    def test_pages_cached_per_query_string(self):
+        """Тест что страницы кешируются по строке запроса"""
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+        # Только загрузка пользователя для JWT
+        with self.assertNumQueries(1):
+            response = self.get()
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual([coupon['title'] for coupon in response.data], ['Test Coupon'])
+
+        self.assertEqual(self.get('ordering=cost_coins&search=test')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('search=test&ordering=cost_coins')['X-Cache'], 'HIT')
+
+    def test_catalog_changes_invalidate_pages(self):
+        """Тест что изменения каталога сбрасывают кеш"""
+        self.get()
+        self.coupon.title = 'Renamed'
+        self.coupon.save()
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data[0]['title'], 'Renamed')
+
+        self.partner.name = 'New name'
+        self.partner.save()
+        self.assertEqual(self.get().data[0]['partner_details']['name'], 'New name')
+
+        CouponCategory.objects.create(name='Fun', slug='fun').delete()
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+
+    def test_cache_metrics(self):
+        """Тест счетчиков попаданий в кеш"""
+        self.get()
+        self.get()
+        self.get()
+        response = self.client.get(reverse('marketplace_cache_metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['hits'], response.data['misses']), (2, 1))
+        self.assertEqual(response.data['hit_ratio'], 0.6667)
+
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('marketplace_cache_metrics')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CatalogSnapshotTest(TransactionTestCase):
+    """Тесты для сжатого снимка каталога"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(identifier='user@example.com', password='testpass123')
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        self.partner = Partner.objects.create(
+            user=User.objects.create_user(identifier='partner@example.com', is_partner=True),
+            name='Test Partner'
+        )
+        self.category = CouponCategory.objects.create(name='Food', slug='food')
+        for i in range(3):
+            CouponTemplate.objects.create(
+                partner=self.partner, category=self.category, title=f'Coupon {i}', cost_coins=10 + i
+            )
+        CouponTemplate.objects.create(
+            partner=self.partner, category=self.category, title='Hidden', cost_coins=5, is_active=False
+        )
+        self.snapshot_url = reverse('catalog_snapshot')
+
+    def test_snapshot_is_normalized_and_compressed(self):
+        """Тест что снимок содержит каждую сущность один раз и отдается в gzip"""
+        response = self.client.get(self.snapshot_url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        catalog = json.loads(gzip.decompress(response.content))
+
+        self.assertEqual(list(catalog['partners']), [str(self.partner.pk)])
+        self.assertEqual(list(catalog['categories']), [str(self.category.pk)])
+        self.assertEqual(sorted(template['title'] for template in catalog['templates'].values()),
+                         ['Coupon 0', 'Coupon 1', 'Coupon 2'])
+        self.assertEqual({template['partner'] for template in catalog['templates'].values()}, {self.partner.pk})
+
+        plain = self.client.get(self.snapshot_url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(json.loads(plain.content), catalog)
+
+    def test_unchanged_catalog_returns_304(self):
+        """Тест что клиент с актуальным ETag получает 304, а после изменения каталога новый снимок"""
+        etag = self.client.get(self.snapshot_url)['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get(self.snapshot_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with mock.patch('partners.snapshot.build_snapshot', wraps=build_snapshot) as build:
+            with transaction.atomic():
+                CouponTemplate.objects.create(partner=self.partner, category=self.category, title='New', cost_coins=1)
+                self.category.name = 'Food & Drink'
+                self.category.save()
+                self.assertEqual(build.call_count, 0)
+        self.assertEqual(build.call_count, 1)
+
+        response = self.client.get(self.snapshot_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(CatalogSnapshot.objects.count(), KEEP_SNAPSHOTS)
+
+
+class CouponRankingTest(TestCase):
+    """Тесты для персональной сортировки маркетплейса"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(identifier='user@example.com', password='testpass123', coins=30)
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        partner = Partner.objects.create(
+            user=User.objects.create_user(identifier='partner@example.com', is_partner=True),
+            name='Test Partner'
+        )
+        food = CouponCategory.objects.create(name='Food', slug='food')
+        fun = CouponCategory.objects.create(name='Fun', slug='fun')
+        self.cheap_food = CouponTemplate.objects.create(partner=partner, category=food, title='Cheap food', cost_coins=20)
+        self.pricey_food = CouponTemplate.objects.create(partner=partner, category=food, title='Pricey food', cost_coins=500)
+        self.cheap_fun = CouponTemplate.objects.create(partner=partner, category=fun, title='Cheap fun', cost_coins=10)
+        old_food = CouponTemplate.objects.create(
+            partner=partner, category=food, title='Old food', cost_coins=5, is_active=False
+        )
+        UserCoupon.objects.create(user=self.user, template=old_food)
+        self.url = reverse('marketplace')
+
+    def recommended(self):
+        response = self.client.get(self.url, {'ordering': 'recommended'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('X-Cache'))
+        return [coupon['title'] for coupon in response.data]
+
+    def test_ranking_follows_history_and_coins(self):
+        """Тест что сортировка учитывает любимую категорию и доступность по коинам"""
+        self.assertEqual(rank_users(), User.objects.count())
+        ranking = CouponRanking.objects.get(user=self.user)
+        self.assertEqual(unpack_ids(ranking.template_ids), [self.cheap_food.pk, self.cheap_fun.pk, self.pricey_food.pk])
+
+        # Пользователь, рейтинг и каталог
+        with self.assertNumQueries(3):
+            self.assertEqual(self.recommended(), ['Cheap food', 'Cheap fun', 'Pricey food'])
+
+        self.user.coins = 1000
+        self.user.save()
+        rank_users([self.user.pk], size=2)
+        self.assertEqual(
+            unpack_ids(CouponRanking.objects.get(user=self.user).template_ids), [self.cheap_food.pk, self.pricey_food.pk]
+        )
+
+    def test_unranked_templates_and_users(self):
+        """Тест что новые купоны идут после рейтинга, а пользователь без рейтинга получает популярные"""
+        CouponTemplate.objects.filter(pk=self.cheap_fun.pk).update(purchased_count=7)
+        self.assertEqual(self.recommended()[0], 'Cheap fun')
+
+        rank_users([self.user.pk], size=1)
+        CouponTemplate.objects.create(
+            partner=self.cheap_food.partner, category=self.cheap_food.category, title='Brand new', cost_coins=1
+        )
+        titles = self.recommended()
+        self.assertEqual(titles[0], 'Cheap food')
+        self.assertEqual(titles[1], 'Brand new')
+        self.assertEqual(len(titles), 4)
+
+    def test_packed_ids(self):
+        """Тест компактного хранения рейтинга"""
+        packed = pack_ids([3, 1, 2 ** 32 - 1])
+        self.assertEqual(len(packed), 12)
+        self.assertEqual(unpack_ids(packed), [3, 1, 2 ** 32 - 1])
+
+
 class PartnerCouponManagementTest(TestCase):
     """Тесты для управления купонами партнера"""
 
@@ -292,22 +605,80 @@ class PartnerDashboardTest(TestCase):
 
     def test_get_dashboard_stats(self):
         """Тест получения статистики дашборда"""
-        CouponTemplate.objects.create(
+        first = CouponTemplate.objects.create(
             partner=self.partner,
             category=self.category,
             title='Coupon 1',
             cost_coins=50,
             purchased_count=10
         )
-        CouponTemplate.objects.create(
+        second = CouponTemplate.objects.create(
             partner=self.partner,
             category=self.category,
             title='Coupon 2',
             cost_coins=100,
             purchased_count=5
         )
+        buyer = User.objects.create_user(identifier='buyer@example.com', password='testpass123')
+        UserCoupon.objects.bulk_create(
+            [UserCoupon(user=buyer, template=first, expires_at=UserCoupon.expiry_for(first)) for _ in range(10)]
+            + [UserCoupon(user=buyer, template=second, expires_at=UserCoupon.expiry_for(second)) for _ in range(5)]
+        )
         response = self.client.get(self.dashboard_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('stats', response.data)
         self.assertEqual(response.data['stats']['total_sold'], 15)
         self.assertEqual(response.data['stats']['revernue_coins'], 1000)  # 10*50 + 5*100
+
+    def test_dashboard_updated_incrementally(self):
+        """Тест что покупки и погашения обновляют статистику без пересчёта"""
+        template = CouponTemplate.objects.create(
+            partner=self.partner, category=self.category, title='Coupon', cost_coins=40
+        )
+        other_partner = Partner.objects.create(
+            user=User.objects.create_user(identifier='other@example.com', is_partner=True),
+            name='Other Partner'
+        )
+        CouponTemplate.objects.create(partner=other_partner, category=self.category, title='Other', cost_coins=10)
+        self.assertEqual(self.client.get(self.dashboard_url).data['stats']['total_active_coupons'], 1)
+
+        buyer = User.objects.create_user(identifier='buyer@example.com', password='testpass123', coins=200)
+        buyer_client = APIClient()
+        buyer_client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(buyer).access_token}')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = buyer_client.post(
+                reverse('cart_checkout'), [{'template_id': template.id, 'count': 3}], format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            # Held units and later price changes must not reach the totals
+            reserve_coupon(buyer, template)
+        template.cost_coins = 60
+        template.save()
+        self.client.post(reverse('redeem_coupon', kwargs={'uuid': response.data[0]['redemption_uuid']}))
+        CouponTemplate.objects.create(
+            partner=self.partner, category=self.category, title='Paused', cost_coins=5, is_active=False
+        )
+
+        with self.assertNumQueries(4):
+            response = self.client.get(self.dashboard_url, {'days': 7})
+        self.assertEqual(response.data['stats'], {
+            'total_active_coupons': 1,
+            'total_sold': 3,
+            'revernue_coins': 120,
+            'total_redeemed': 1,
+        })
+        self.assertEqual(len(response.data['daily']), 7)
+        self.assertEqual(response.data['daily'][-1], {
+            'day': timezone.localdate(), 'sold': 3, 'revenue_coins': 120, 'redeemed': 1
+        })
+
+        stats = PartnerStats.objects.get(partner=self.partner)
+        rebuilt = rebuild_partner_stats(self.partner.pk)
+        self.assertEqual(
+            (stats.active_templates, stats.sold, stats.revenue_coins, stats.redeemed),
+            (rebuilt.active_templates, rebuilt.sold, rebuilt.revenue_coins, rebuilt.redeemed)
+        )
+        self.assertEqual(
+            list(PartnerDailyStats.objects.filter(partner=self.partner).values_list('sold', 'revenue_coins')),
+            [(3, 120)]
+        )
@@ -1,6 +1,8 @@
 from django.urls import path
 from .views import (
     CouponMarketplaceView,
+    MarketplaceCacheMetricsView,
+    CatalogSnapshotView,
     PartnerListView,
     PartnerCouponManagementView,
     PartnerCouponDetailView,
@@ -9,6 +11,8 @@ from .views import (
 
 urlpatterns = [
     path('marketplace/', CouponMarketplaceView.as_view(), name='marketplace'),
+    path('marketplace/cache/metrics/', MarketplaceCacheMetricsView.as_view(), name='marketplace_cache_metrics'),
+    path('catalog/snapshot/', CatalogSnapshotView.as_view(), name='catalog_snapshot'),
     path('brands/', PartnerListView.as_view(), name='brands_list'),
 
     path('dashboard/', PartnerDashboardStatsView.as_view(), name='partner_dashboard'),
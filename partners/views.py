@@ -1,22 +1,80 @@
+import gzip
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
 from rest_framework import generics, filters
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.db.models import Sum
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 
+from .cache import cache_metrics, get_page, store_page
 from .models import CouponTemplate, Partner, CouponCategory
 from .serializers import CouponTemplateSerializer, PartnerSerializer, CouponCategorySerializer
 from .permissions import IsPartner, IsOwnerOfCoupon
+from .ranking import RecommendedOrderingFilter
+from .search import FullTextSearchFilter
+from .snapshot import latest_snapshot, snapshot_bodies
+from .stock import with_live_stock
+from .stats import daily_series, get_partner_stats
+
+DEFAULT_DASHBOARD_DAYS = 30
+MAX_DASHBOARD_DAYS = 365
 
 class CouponMarketplaceView(generics.ListAPIView):
-    queryset = CouponTemplate.objects.filter(is_active=True,partner__is_active=True)
+    queryset = with_live_stock(
+        CouponTemplate.objects.filter(is_active=True,partner__is_active=True).select_related('partner', 'category')
+    )
     serializer_class = CouponTemplateSerializer
     permission_classes = [IsAuthenticated]
 
-    filter_backends = (filters.SearchFilter, filters.OrderingFilter)
-    search_fields = ('title','description','partner__name')
+    filter_backends = (FullTextSearchFilter, RecommendedOrderingFilter, filters.OrderingFilter)
     ordering_fields = ['cost_coins','created_at']
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('ordering') == RecommendedOrderingFilter.ordering_value:
+            # Personal order, nothing to share with other users
+            return super().list(request, *args, **kwargs)
+
+        # Other pages are the same for every user, so they are cached per query string and catalog version.
+        key, data = get_page(request)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = super().list(request, *args, **kwargs)
+        store_page(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+class CatalogSnapshotView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        pk, etag = latest_snapshot()
+        etag = f'"{etag}"'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            body = snapshot_bodies.get(pk)
+            if 'gzip' in request.headers.get('Accept-Encoding', ''):
+                response = HttpResponse(body, content_type='application/json')
+                response['Content-Encoding'] = 'gzip'
+            else:
+                response = HttpResponse(gzip.decompress(body), content_type='application/json')
+        response['ETag'] = etag
+        # Clients keep their copy but ask every time whether it is still current
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+class MarketplaceCacheMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_metrics())
+
 class PartnerListView(generics.ListAPIView):
     queryset = Partner.objects.filter(is_active=True)
     serializer_class = PartnerSerializer
@@ -27,7 +85,7 @@ class PartnerCouponManagementView(generics.ListCreateAPIView):
     permission_classes = [IsPartner]
 
     def get_queryset(self):
-        return CouponTemplate.objects.filter(partner=self.request.user.partner)
+        return with_live_stock(CouponTemplate.objects.filter(partner=self.request.user.partner))
 
     def perform_create(self, serializer):
         serializer.save(partner=self.request.user.partner)
@@ -41,18 +99,21 @@ class PartnerDashboardStatsView(APIView):
     permission_classes = [IsPartner]
 
     def get(self, request):
-        partners = self.request.user.partner
-        my_coupons = CouponTemplate.objects.filter(partner=partners)
+        partner = self.request.user.partner
+        try:
+            days = min(max(int(request.query_params.get('days', DEFAULT_DASHBOARD_DAYS)), 1), MAX_DASHBOARD_DAYS)
+        except ValueError:
+            return Response({'detail': 'days must be an integer.'}, status=400)
 
-        total_active_coupons = CouponTemplate.objects.filter(is_active=True).count()
-        total_sold = my_coupons.aggregate(Sum('purchased_count'))['purchased_count__sum'] or 0
-        revernue_coins = sum(c.cost_coins * c.purchased_count for c in my_coupons)
+        stats = get_partner_stats(partner.pk)
 
         return Response({
-            'partner_name': partners.name,
+            'partner_name': partner.name,
             "stats":{
-                "total_active_coupons": total_active_coupons,
-                "total_sold": total_sold,
-                "revernue_coins": revernue_coins,
-            }
-        })
\ No newline at end of file
+                "total_active_coupons": stats.active_templates,
+                "total_sold": stats.sold,
+                "revernue_coins": stats.revenue_coins,
+                "total_redeemed": stats.redeemed,
+            },
+            "daily": daily_series(partner.pk, days),
+        })
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserCoupon
+from .models import StockReservation, UserCoupon
 
 admin.site.register(UserCoupon)
-
+admin.site.register(StockReservation)
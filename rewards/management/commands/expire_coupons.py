@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from rewards.services import expire_coupons
+
+
+class Command(BaseCommand):
+    help = "Flags unredeemed coupons past their expiry date as expired, in short batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Coupons flagged per UPDATE.")
+
+    def handle(self, *args, **options):
+        expired = expire_coupons(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} coupons."))
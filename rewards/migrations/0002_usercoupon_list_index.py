@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partners', '0002_coupon_stock_shards'),
+        ('rewards', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usercoupon',
+            index=models.Index(fields=['user', 'is_redeemed', '-purchased_at', '-id'], name='coupon_user_list_idx'),
+        ),
+    ]
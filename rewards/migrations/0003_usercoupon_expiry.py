@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:20
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_expires_at(apps, schema_editor):
+    CouponTemplate = apps.get_model('partners', 'CouponTemplate')
+    UserCoupon = apps.get_model('rewards', 'UserCoupon')
+
+    # One UPDATE per validity period instead of one per coupon.
+    for validity_days in CouponTemplate.objects.values_list('validity_days', flat=True).distinct():
+        UserCoupon.objects.filter(expires_at__isnull=True, template__validity_days=validity_days).update(
+            expires_at=models.F('purchased_at') + timedelta(days=validity_days)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partners', '0002_coupon_stock_shards'),
+        ('rewards', '0002_usercoupon_list_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercoupon',
+            name='expires_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='usercoupon',
+            name='expires_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddField(
+            model_name='usercoupon',
+            name='is_expired',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='usercoupon',
+            index=models.Index(fields=['user', 'is_redeemed', 'expires_at'], name='coupon_wallet_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usercoupon',
+            index=models.Index(condition=models.Q(('is_expired', False), ('is_redeemed', False)), fields=['expires_at'], name='coupon_pending_expiry_idx'),
+        ),
+    ]
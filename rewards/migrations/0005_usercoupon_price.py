@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rewards', '0004_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercoupon',
+            name='price_coins',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
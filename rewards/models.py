@@ -1,8 +1,7 @@
 import uuid
-import qrcode
-from io import BytesIO
-from django.core.files import File
+from datetime import timedelta
 from django.db import models
+from django.utils import timezone
 from django.conf import settings
 from partners.models import CouponTemplate
 
@@ -21,27 +20,59 @@ class UserCoupon(models.Model):
 
     redemption_uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
 
+    # Only set for coupons issued before QR codes were rendered on the fly by rewards.qr
     qr_code_image = models.ImageField(upload_to='qr_codes/', blank=True, null=True)
 
     is_redeemed = models.BooleanField(default=False)
     redeemed_at = models.DateTimeField(null=True, blank=True)
     purchased_at = models.DateTimeField(auto_now_add=True)
+    # What the buyer paid; empty for coupons issued before prices were recorded
+    price_coins = models.PositiveIntegerField(null=True, blank=True)
+    expires_at = models.DateTimeField()
+    # Set by the expire_coupons sweeper; expires_at alone decides whether a coupon is still usable
+    is_expired = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_redeemed', '-purchased_at', '-id'], name='coupon_user_list_idx'),
+            models.Index(fields=['user', 'is_redeemed', 'expires_at'], name='coupon_wallet_idx'),
+            models.Index(fields=['expires_at'], condition=models.Q(is_redeemed=False, is_expired=False),
+                         name='coupon_pending_expiry_idx'),
+        ]
+
+    @staticmethod
+    def expiry_for(template, moment=None):
+        return (moment or timezone.now()) + timedelta(days=template.validity_days)
 
     def save(self, *args, **kwargs):
-        if not self.qr_code_image:
-            qr_data = f"{settings.BASE_API_URL}/rewards/redeem/{self.redemption_uuid}/"
+        if self.expires_at is None:
+            self.expires_at = self.expiry_for(self.template)
+        super().save(*args, **kwargs)
 
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-            img = qr.make_image(fill='black', back_color='white')
+    def __str__(self):
+        return f"Coupon for {self.user} - {self.template.title}"
 
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-            file_name = f'qr-{self.redemption_uuid}.png'
-            self.qr_code_image.save(file_name, File(buffer), save=False)
 
-        super().save(*args, **kwargs)
+class StockReservation(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='stock_reservations'
+    )
+    template = models.ForeignKey(
+        CouponTemplate,
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Stale rows are released lazily, when a buyer of the same template runs out of stock
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['template', 'expires_at'], name='reservation_expiry_idx'),
+        ]
 
     def __str__(self):
-        return f"Coupon for {self.user} - {self.template.title}"
\ No newline at end of file
+        return f"{self.count} x {self.template.title} held for {self.user}"
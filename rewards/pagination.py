@@ -0,0 +1,5 @@
+from steps_tracking.pagination import KeysetPagination
+
+
+class UserCouponPagination(KeysetPagination):
+    ordering = ('is_redeemed', '-purchased_at', '-id')
@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import qrcode
+from django.conf import settings
+
+FORMATS = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+}
+# Bump when the rendering changes, so clients drop their immutable copies.
+RENDER_VERSION = 1
+
+
+def qr_payload(redemption_uuid):
+    return f"{settings.BASE_API_URL}/rewards/redeem/{redemption_uuid}/"
+
+
+def qr_etag(redemption_uuid, fmt):
+    return f'"qr-{redemption_uuid}-{fmt}-v{RENDER_VERSION}"'
+
+
+def qr_matrix(redemption_uuid):
+    qr = qrcode.QRCode(version=1, border=4)
+    qr.add_data(qr_payload(redemption_uuid))
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_qr_svg(redemption_uuid):
+    """One path with a rectangle per horizontal run of dark modules keeps the SVG small."""
+    matrix = qr_matrix(redemption_uuid)
+    size = len(matrix)
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < size and row[x]:
+                x += 1
+            runs.append(f'M{start} {y}h{x - start}v1h-{x - start}z')
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{"".join(runs)}"/></svg>'
+    ).encode()
+
+
+def render_qr_png(redemption_uuid):
+    """The same UUID always renders the same image, so it can be rebuilt at any time."""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(qr_payload(redemption_uuid))
+    qr.make(fit=True)
+    img = qr.make_image(fill='black', back_color='white')
+
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    'svg': render_qr_svg,
+    'png': render_qr_png,
+}
+
+
+class ByteLRUCache:
+    """Thread-safe LRU that evicts least recently used entries once their total size passes ``max_bytes``."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+qr_cache = ByteLRUCache(settings.QR_CACHE_MAX_BYTES)
+
+
+def get_qr_image(redemption_uuid, fmt):
+    key = (str(redemption_uuid), fmt)
+    image = qr_cache.get(key)
+    if image is None:
+        image = RENDERERS[fmt](redemption_uuid)
+        qr_cache.set(key, image)
+    return image
@@ -1,12 +1,28 @@
 # rewards/serializers.py
+from django.urls import reverse
 from rest_framework import serializers
-from .models import UserCoupon
+from .models import StockReservation, UserCoupon
 from partners.serializers import CouponTemplateSerializer
 
 
-class UserCouponSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Keeps only the fields listed in ``?fields=a,b`` when the request asks for them."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request else None
+        if requested:
+            wanted = {name.strip() for name in requested.split(',')}
+            fields = {name: field for name, field in fields.items() if name in wanted}
+        return fields
+
+
+class UserCouponSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Вкладываем полную информацию о купоне (название, описание, картинка партнера)
     coupon_details = CouponTemplateSerializer(source='template', read_only=True)
+    # Старые купоны отдают сохранённый файл, новые рендерятся на лету
+    qr_code_image = serializers.SerializerMethodField()
 
     class Meta:
         model = UserCoupon
@@ -17,5 +33,49 @@ class UserCouponSerializer(serializers.ModelSerializer):
             'qr_code_image',
             'is_redeemed',
             'redeemed_at',
-            'purchased_at'
-        ]
\ No newline at end of file
+            'purchased_at',
+            'expires_at'
+        ]
+
+    def get_qr_code_image(self, obj):
+        if obj.qr_code_image:
+            url = obj.qr_code_image.url
+        else:
+            url = reverse('coupon_qr', kwargs={'uuid': obj.redemption_uuid})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+
+class UserCouponCompactSerializer(UserCouponSerializer):
+    # Шаблоны передаются один раз в общей карте templates
+    template = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta(UserCouponSerializer.Meta):
+        fields = [
+            'id',
+            'template',
+            'redemption_uuid',
+            'qr_code_image',
+            'is_redeemed',
+            'redeemed_at',
+            'purchased_at',
+            'expires_at'
+        ]
+
+
+class CouponScanSerializer(serializers.Serializer):
+    uuid = serializers.UUIDField()
+    scanned_at = serializers.DateTimeField(required=False)
+
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockReservation
+        fields = ['id', 'template', 'count', 'created_at', 'expires_at']
+        read_only_fields = fields
+
+
+class CartItemSerializer(serializers.Serializer):
+    template_id = serializers.IntegerField(min_value=1)
+    count = serializers.IntegerField(min_value=1, default=1)
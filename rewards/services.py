@@ -0,0 +1,288 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from partners.models import CouponTemplate
+from partners.stats import record_redemptions, record_sales
+from partners.stock import OutOfStock, return_units, take_units
+from steps_tracking.ledger import apply_transactions, post_transaction
+from steps_tracking.models import CoinTransaction
+from .models import StockReservation, UserCoupon
+
+
+def release_expired_reservations(template_id, limit=100):
+    """
+    Puts the units of up to ``limit`` stale reservations of one template back on sale.
+    Each row is claimed by its own DELETE, so concurrent callers never return a unit twice.
+    Returns the number of released units.
+    """
+    stale = list(
+        StockReservation.objects.filter(template_id=template_id, expires_at__lte=timezone.now())
+        .order_by('expires_at')
+        .values_list('pk', 'count')[:limit]
+    )
+    if not stale:
+        return 0
+
+    released = 0
+    with transaction.atomic():
+        for pk, count in stale:
+            deleted, _ = StockReservation.objects.filter(pk=pk).delete()
+            if deleted:
+                released += count
+        if released:
+            return_units(CouponTemplate.objects.get(pk=template_id), released)
+    return released
+
+
+def retry_after_release(action):
+    """Runs ``action`` once more when it ran out of stock that stale reservations were still holding."""
+    try:
+        return action()
+    except OutOfStock as error:
+        if not release_expired_reservations(error.args[0]):
+            raise
+    return action()
+
+
+def purchase_coupon(user, template):
+    """
+    Charges ``user`` and issues one coupon of ``template`` in a single transaction.
+    Raises InsufficientCoins or OutOfStock and leaves nothing behind when either check fails.
+    """
+    return retry_after_release(lambda: _purchase_coupon(user, template))
+
+
+def _purchase_coupon(user, template):
+    with transaction.atomic():
+        post_transaction(
+            user,
+            -template.cost_coins,
+            CoinTransaction.TransactionType.SPENT,
+            f"Coupon purchase ({template.title})",
+            allow_negative=False
+        )
+        user_coupon = UserCoupon.objects.create(user=user, template=template, price_coins=template.cost_coins)
+        # Applied after the commit, so buyers of one partner never wait on its stats rows.
+        record_sales([(template.partner_id, 1, template.cost_coins)])
+        # Last, so the contended template row stays locked only until the commit.
+        take_units(template)
+    return user_coupon
+
+
+class UnavailableCoupon(Exception):
+    pass
+
+
+def checkout_cart(user, items):
+    """
+    Buys every (template_id, count) of ``items`` in one transaction, or nothing.
+
+    The cost grows with the number of distinct templates: one query loads them,
+    the ledger debits the whole cart in a single conditional UPDATE, each template
+    takes its stock with one conditional UPDATE and the coupons are inserted with
+    one bulk_create. QR images are rendered later on request.
+    Raises UnavailableCoupon or OutOfStock with the failing template id, or InsufficientCoins.
+    """
+    counts = {}
+    for template_id, count in items:
+        counts[template_id] = counts.get(template_id, 0) + count
+    return retry_after_release(lambda: _checkout_cart(user, counts))
+
+
+def _checkout_cart(user, counts):
+    templates = CouponTemplate.objects.select_related('partner', 'category').in_bulk(list(counts))
+    for template_id in counts:
+        template = templates.get(template_id)
+        if template is None or not template.is_active:
+            raise UnavailableCoupon(template_id)
+
+    now = timezone.now()
+    with transaction.atomic():
+        apply_transactions(
+            user,
+            created=[
+                CoinTransaction(
+                    user=user,
+                    amount=-templates[template_id].cost_coins * count,
+                    transaction_type=CoinTransaction.TransactionType.SPENT,
+                    reason=f"Coupon purchase ({templates[template_id].title} x{count})"
+                )
+                for template_id, count in counts.items()
+            ],
+            allow_negative=False
+        )
+        coupons = UserCoupon.objects.bulk_create([
+            UserCoupon(user=user, template=templates[template_id], price_coins=templates[template_id].cost_coins,
+                       expires_at=UserCoupon.expiry_for(templates[template_id], now))
+            for template_id, count in counts.items()
+            for _ in range(count)
+        ])
+        sales = defaultdict(lambda: [0, 0])
+        for template_id, count in counts.items():
+            template = templates[template_id]
+            sales[template.partner_id][0] += count
+            sales[template.partner_id][1] += template.cost_coins * count
+        record_sales((partner_id, count, coins) for partner_id, (count, coins) in sorted(sales.items()))
+        # Last, so the contended template rows stay locked only until the commit,
+        # and in id order, so two carts never wait on each other's rows.
+        for template_id in sorted(counts):
+            take_units(templates[template_id], counts[template_id])
+    return coupons
+
+
+class ReservationExpired(Exception):
+    pass
+
+
+def reserve_coupon(user, template, count=1):
+    """
+    Holds ``count`` units of ``template`` for COUPON_RESERVATION_SECONDS. The stock is
+    taken with the same conditional UPDATE as a purchase, so nothing locks the template
+    row beyond that statement. Raises OutOfStock.
+    """
+    def reserve():
+        with transaction.atomic():
+            reservation = StockReservation.objects.create(
+                user=user,
+                template=template,
+                count=count,
+                expires_at=timezone.now() + timedelta(seconds=settings.COUPON_RESERVATION_SECONDS)
+            )
+            take_units(template, count)
+        return reservation
+
+    return retry_after_release(reserve)
+
+
+def confirm_reservation(reservation):
+    """
+    Charges the reservation's owner and turns it into coupons. Deleting the row claims it,
+    so a reservation is confirmed at most once and never after it expired.
+    A coupon deactivated while it was held gives its units back and raises UnavailableCoupon.
+    Raises ReservationExpired or InsufficientCoins; the reservation stays held on the latter.
+    """
+    template = reservation.template
+    if not CouponTemplate.objects.filter(pk=template.pk, is_active=True, partner__is_active=True).exists():
+        cancel_reservation(reservation)
+        raise UnavailableCoupon(template.pk)
+
+    now = timezone.now()
+    with transaction.atomic():
+        deleted, _ = StockReservation.objects.filter(pk=reservation.pk, expires_at__gt=now).delete()
+        if not deleted:
+            raise ReservationExpired(reservation.pk)
+
+        post_transaction(
+            reservation.user,
+            -template.cost_coins * reservation.count,
+            CoinTransaction.TransactionType.SPENT,
+            f"Coupon purchase ({template.title})",
+            allow_negative=False
+        )
+        coupons = UserCoupon.objects.bulk_create([
+            UserCoupon(user=reservation.user, template=template, price_coins=template.cost_coins,
+                       expires_at=UserCoupon.expiry_for(template, now))
+            for _ in range(reservation.count)
+        ])
+        record_sales([(template.partner_id, reservation.count, template.cost_coins * reservation.count)], now)
+    return coupons
+
+
+def cancel_reservation(reservation):
+    """Gives the held units back right away instead of waiting for the reservation to expire."""
+    with transaction.atomic():
+        deleted, _ = StockReservation.objects.filter(pk=reservation.pk).delete()
+        if deleted:
+            return_units(reservation.template, reservation.count)
+    return bool(deleted)
+
+
+REDEMPTION_FIELDS = ('id', 'redemption_uuid', 'is_redeemed', 'redeemed_at', 'expires_at', 'template__partner_id',
+                     'template__title', 'user__email')
+
+
+def redeem_coupon(partner, redemption_uuid):
+    """
+    Redeems one coupon with a single conditional UPDATE (uuid, not yet redeemed,
+    not expired, owned by ``partner``). Returns (redeemed, coupon values) where the
+    values come from one joined SELECT and are None when the uuid is unknown.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        redeemed = UserCoupon.objects.filter(
+            redemption_uuid=redemption_uuid,
+            is_redeemed=False,
+            expires_at__gt=now,
+            template__partner=partner
+        ).update(is_redeemed=True, redeemed_at=now)
+        if redeemed:
+            record_redemptions(partner.pk, [now])
+    coupon = UserCoupon.objects.filter(redemption_uuid=redemption_uuid).values(*REDEMPTION_FIELDS).first()
+    return bool(redeemed), coupon
+
+
+def redeem_scans(partner, scans):
+    """
+    Redeems queued offline scans of ``partner`` with one locking SELECT and one UPDATE.
+    ``scans`` holds (redemption_uuid, scanned_at) pairs; scanned_at becomes redeemed_at
+    and a coupon that expired after its offline scan is still honoured.
+    Returns (status, coupon values) per scan, in order.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        coupons = {
+            coupon['redemption_uuid']: coupon
+            for coupon in UserCoupon.objects.select_for_update(of=('self',))
+            .filter(redemption_uuid__in={redemption_uuid for redemption_uuid, _ in scans})
+            .values(*REDEMPTION_FIELDS)
+        }
+
+        results, redeemed_at = [], {}
+        for redemption_uuid, scanned_at in scans:
+            # Offline devices may have skewed clocks, never record a redemption in the future.
+            scanned_at = min(scanned_at or now, now)
+            coupon = coupons.get(redemption_uuid)
+            if coupon is None:
+                results.append(('not_found', None))
+            elif coupon['template__partner_id'] != partner.pk:
+                results.append(('forbidden', None))
+            elif coupon['id'] in redeemed_at:
+                results.append(('duplicate', coupon))
+            elif coupon['is_redeemed']:
+                results.append(('already_redeemed', coupon))
+            elif coupon['expires_at'] <= scanned_at:
+                results.append(('expired', coupon))
+            else:
+                coupon['redeemed_at'] = scanned_at
+                redeemed_at[coupon['id']] = coupon['redeemed_at']
+                results.append(('redeemed', coupon))
+
+        if redeemed_at:
+            UserCoupon.objects.filter(pk__in=list(redeemed_at), is_redeemed=False).update(
+                is_redeemed=True,
+                redeemed_at=models.Case(
+                    *[models.When(pk=pk, then=models.Value(moment)) for pk, moment in redeemed_at.items()],
+                    output_field=models.DateTimeField()
+                )
+            )
+            record_redemptions(partner.pk, redeemed_at.values())
+    return results
+
+
+def expire_coupons(chunk_size=1000, now=None):
+    """
+    Flags unredeemed coupons past their expires_at as is_expired, ``chunk_size``
+    rows per UPDATE so no write holds the table for long. Returns the number flagged.
+    """
+    now = now or timezone.now()
+    pending = UserCoupon.objects.filter(is_redeemed=False, is_expired=False, expires_at__lte=now)
+    expired = 0
+    while True:
+        chunk = list(pending.order_by('expires_at').values_list('pk', flat=True)[:chunk_size])
+        if not chunk:
+            return expired
+        expired += pending.filter(pk__in=chunk).update(is_expired=True)
@@ -1,17 +1,36 @@
-from django.test import TestCase
+import threading
+import time
+from django.test import TestCase, TransactionTestCase
+from django.db import connection, OperationalError
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
-from partners.models import Partner, CouponCategory, CouponTemplate
-from .models import UserCoupon
+from partners.models import Partner, CouponCategory, CouponTemplate, CouponStockShard
+from partners.stock import OutOfStock, reshard, take_units
+from steps_tracking.ledger import InsufficientCoins
+from steps_tracking.models import CoinTransaction
+from .models import StockReservation, UserCoupon
+from .qr import ByteLRUCache
+from .services import confirm_reservation, expire_coupons, purchase_coupon, reserve_coupon
 import uuid
+from datetime import timedelta
 
 User = get_user_model()
 
 
+def retry_on_lock(action):
+    while True:
+        try:
+            return action()
+        except OperationalError:
+            # SQLite allows one writer at a time; other databases wait on row locks instead
+            time.sleep(0.001)
+
+
 class BuyCouponTest(TestCase):
     """Тесты для покупки купонов"""
 
@@ -67,6 +86,13 @@ class BuyCouponTest(TestCase):
         self.coupon_template.refresh_from_db()
         self.assertEqual(self.coupon_template.purchased_count, 1)
 
+        # Проверяем что списание записано в журнал
+        self.assertTrue(CoinTransaction.objects.filter(
+            user=self.user,
+            amount=-100,
+            transaction_type=CoinTransaction.TransactionType.SPENT
+        ).exists())
+
     def test_buy_coupon_insufficient_coins(self):
         """Тест покупки при недостатке монет"""
         self.user.coins = 50
@@ -109,13 +135,326 @@ class BuyCouponTest(TestCase):
         self.assertIn('закончились', response.data['error'])
 
     def test_buy_coupon_creates_qr_code(self):
-        """Тест что при покупке создается QR код"""
+        """Тест что QR код отдаётся на лету и не сохраняется на диск"""
         buy_url = reverse('buy_coupon', kwargs={'template_id': self.coupon_template.id})
         response = self.client.post(buy_url)
         user_coupon = UserCoupon.objects.get(user=self.user)
-        self.assertIsNotNone(user_coupon.qr_code_image)
+        self.assertFalse(user_coupon.qr_code_image)
         self.assertIsNotNone(user_coupon.redemption_uuid)
 
+        qr_url = reverse('coupon_qr', kwargs={'uuid': user_coupon.redemption_uuid})
+        self.assertTrue(response.data['qr_code_image'].endswith(qr_url))
+
+        response = self.client.get(qr_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertTrue(response.content.startswith(b'<svg'))
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(qr_url, {'type': 'png'})
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+
+        user_coupon.refresh_from_db()
+        self.assertFalse(user_coupon.qr_code_image)
+
+    def test_qr_code_etag(self):
+        """Тест что повторный запрос с ETag получает 304"""
+        user_coupon = UserCoupon.objects.create(user=self.user, template=self.coupon_template)
+        qr_url = reverse('coupon_qr', kwargs={'uuid': user_coupon.redemption_uuid})
+
+        etag = self.client.get(qr_url)['ETag']
+        response = self.client.get(qr_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertNotEqual(self.client.get(qr_url, {'type': 'png'})['ETag'], etag)
+        self.assertEqual(self.client.get(qr_url, {'type': 'gif'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_qr_cache_evicts_by_size(self):
+        """Тест что LRU кэш вытесняет старые записи по размеру"""
+        cache = ByteLRUCache(max_bytes=10)
+        cache.set('a', b'1234')
+        cache.set('b', b'1234')
+        cache.get('a')
+        cache.set('c', b'1234')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1234')
+        self.assertEqual(cache.size, 8)
+
+    def test_qr_code_only_for_owner(self):
+        """Тест что чужой QR код недоступен"""
+        user_coupon = UserCoupon.objects.create(user=self.user, template=self.coupon_template)
+        other_user = User.objects.create_user(
+            identifier='other@example.com',
+            password='testpass123'
+        )
+        refresh = RefreshToken.for_user(other_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        response = self.client.get(reverse('coupon_qr', kwargs={'uuid': user_coupon.redemption_uuid}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+
+class CartCheckoutTest(TestCase):
+    """Тесты для оформления корзины из нескольких купонов"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            identifier='user@example.com',
+            password='testpass123',
+            coins=1000
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        partner = Partner.objects.create(
+            user=User.objects.create_user(identifier='partner@example.com', is_partner=True),
+            name='Test Partner'
+        )
+        category = CouponCategory.objects.create(name='Food', slug='food')
+        self.limited = CouponTemplate.objects.create(
+            partner=partner, category=category, title='Limited', cost_coins=50, quantity=5
+        )
+        self.unlimited = CouponTemplate.objects.create(
+            partner=partner, category=category, title='Unlimited', cost_coins=20
+        )
+        self.checkout_url = reverse('cart_checkout')
+
+    def checkout(self, *items):
+        return self.client.post(
+            self.checkout_url,
+            [{'template_id': template.id, 'count': count} for template, count in items],
+            format='json'
+        )
+
+    def test_checkout_cart(self):
+        """Тест покупки нескольких купонов одним запросом"""
+        response = self.checkout((self.limited, 3), (self.unlimited, 2))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 5)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 1000 - 3 * 50 - 2 * 20)
+        self.limited.refresh_from_db()
+        self.assertEqual((self.limited.quantity, self.limited.purchased_count), (2, 3))
+        self.assertEqual(UserCoupon.objects.filter(user=self.user).count(), 5)
+        self.assertFalse(UserCoupon.objects.filter(user=self.user, expires_at__isnull=True).exists())
+        self.assertEqual(CoinTransaction.objects.filter(
+            user=self.user, transaction_type=CoinTransaction.TransactionType.SPENT
+        ).count(), 2)
+
+    def test_out_of_stock_rolls_back_cart(self):
+        """Тест что нехватка одного купона отменяет всю корзину"""
+        response = self.checkout((self.unlimited, 2), (self.limited, 6))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['template_id'], self.limited.id)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 1000)
+        self.assertFalse(UserCoupon.objects.exists())
+        self.assertFalse(CoinTransaction.objects.exists())
+
+    def test_insufficient_coins_for_cart(self):
+        """Тест что корзина дороже баланса не покупается"""
+        response = self.checkout((self.limited, 5), (self.unlimited, 40))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Недостаточно', response.data['error'])
+        self.limited.refresh_from_db()
+        self.assertEqual(self.limited.quantity, 5)
+
+    def test_checkout_queries_grow_with_templates_not_coupons(self):
+        """Тест что число запросов зависит от числа шаблонов, а не купонов"""
+        def queries_for(*items):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.checkout(*items)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(queries_for((self.limited, 1), (self.unlimited, 1)),
+                         queries_for((self.limited, 4), (self.unlimited, 30)))
+
+class CouponFlashSaleTest(TransactionTestCase):
+    """Тесты конкурентной покупки купонов с ограниченным количеством"""
+
+    STOCK = 100
+    BUYERS = 140
+    THREADS = 8
+
+    def setUp(self):
+        partner_user = User.objects.create_user(
+            identifier='partner@example.com',
+            password='testpass123',
+            is_partner=True
+        )
+        partner = Partner.objects.create(user=partner_user, name='Test Partner')
+        category = CouponCategory.objects.create(name='Food', slug='food')
+        self.template = CouponTemplate.objects.create(
+            partner=partner,
+            category=category,
+            title='Flash Coupon',
+            cost_coins=10,
+            quantity=self.STOCK
+        )
+        for i in range(self.BUYERS):
+            User.objects.create_user(identifier=f'buyer{i}@example.com', coins=10)
+
+    def hammer(self, template, purchase=purchase_coupon):
+        buyers = list(User.objects.filter(email__startswith='buyer'))
+        sold, sold_out, lock = [], [], threading.Lock()
+
+        def buy(user):
+            try:
+                retry_on_lock(lambda: purchase(user, template))
+                return sold
+            except (OutOfStock, InsufficientCoins):
+                return sold_out
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not buyers:
+                            return
+                        user = buyers.pop()
+                    outcome = buy(user)
+                    with lock:
+                        outcome.append(user.pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sold, sold_out
+
+    def assert_exactly_stock_sold(self, sold, sold_out):
+        self.assertEqual(len(sold), self.STOCK)
+        self.assertEqual(len(sold_out), self.BUYERS - self.STOCK)
+        self.assertEqual(UserCoupon.objects.filter(template=self.template).count(), self.STOCK)
+        self.assertEqual(User.objects.filter(pk__in=sold, coins=0).count(), self.STOCK)
+        self.assertEqual(User.objects.filter(pk__in=sold_out, coins=10).count(), self.BUYERS - self.STOCK)
+
+    def test_concurrent_buyers_never_oversell(self):
+        """Тест что при конкурентных покупках продаётся ровно весь запас"""
+        sold, sold_out = self.hammer(self.template)
+        self.assert_exactly_stock_sold(sold, sold_out)
+
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.quantity, 0)
+        self.assertEqual(self.template.purchased_count, self.STOCK)
+
+    def test_sharded_stock_never_oversells(self):
+        """Тест что шардированный счётчик тоже продаёт ровно весь запас"""
+        template = reshard(self.template, 4)
+        self.assertEqual(
+            sorted(CouponStockShard.objects.filter(template=template).values_list('quantity', flat=True)),
+            [25, 25, 25, 25]
+        )
+
+        sold, sold_out = self.hammer(template)
+        self.assert_exactly_stock_sold(sold, sold_out)
+
+        template = reshard(template, 0)
+        self.assertEqual((template.quantity, template.purchased_count, template.stock_shards), (0, self.STOCK, 0))
+        self.assertFalse(CouponStockShard.objects.exists())
+
+    def test_concurrent_reservations_never_oversell(self):
+        """Тест что бронирование с подтверждением продаёт ровно весь запас"""
+        def reserve_and_confirm(user, template):
+            reservation = retry_on_lock(lambda: reserve_coupon(user, template))
+            return retry_on_lock(lambda: confirm_reservation(reservation))
+
+        sold, sold_out = self.hammer(self.template, reserve_and_confirm)
+        self.assert_exactly_stock_sold(sold, sold_out)
+        self.assertFalse(StockReservation.objects.exists())
+
+class StockReservationTest(TestCase):
+    """Тесты для бронирования купонов перед покупкой"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(identifier='user@example.com', password='testpass123', coins=100)
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        partner = Partner.objects.create(
+            user=User.objects.create_user(identifier='partner@example.com', is_partner=True),
+            name='Test Partner'
+        )
+        category = CouponCategory.objects.create(name='Food', slug='food')
+        self.template = CouponTemplate.objects.create(
+            partner=partner, category=category, title='Limited', cost_coins=20, quantity=3
+        )
+
+    def reserve(self, count=1):
+        return self.client.post(reverse('reserve_coupon', kwargs={'template_id': self.template.id}), {'count': count})
+
+    def test_reserve_and_confirm(self):
+        """Тест что бронь удерживает запас, а подтверждение выдаёт купоны"""
+        response = self.reserve(2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.quantity, 1)
+        self.assertEqual(self.reserve(2).status_code, status.HTTP_400_BAD_REQUEST)
+
+        confirm_url = reverse('confirm_reservation', kwargs={'pk': response.data['id']})
+        response = self.client.post(confirm_url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 2)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 60)
+        self.assertEqual(self.client.post(confirm_url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_confirm_rejects_deactivated_coupon(self):
+        """Тест что купон, отключённый во время брони, нельзя оплатить"""
+        reservation_id = self.reserve(2).data['id']
+        self.template.is_active = False
+        self.template.save(update_fields=['is_active'])
+
+        response = self.client.post(reverse('confirm_reservation', kwargs={'pk': reservation_id}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UserCoupon.objects.exists())
+        self.assertFalse(StockReservation.objects.exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 100)
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.quantity, 3)
+
+    def test_expired_reservation_is_released_lazily(self):
+        """Тест что просроченная бронь не подтверждается и освобождает запас при нехватке"""
+        response = self.reserve(3)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.client.post(reverse('confirm_reservation', kwargs={'pk': response.data['id']}))
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.quantity, 0)
+
+        other = User.objects.create_user(identifier='other@example.com', coins=100)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        response = self.client.post(reverse('buy_coupon', kwargs={'template_id': self.template.id}))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(StockReservation.objects.exists())
+        self.template.refresh_from_db()
+        self.assertEqual((self.template.quantity, self.template.purchased_count), (2, 1))
+
+    def test_cancel_reservation_on_shards(self):
+        """Тест что отмена брони возвращает запас в шарды"""
+        self.template = reshard(self.template, 2)
+        take_units(self.template)
+        self.template = reshard(self.template, 2)
+
+        response = self.reserve(2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.delete(reverse('reservation', kwargs={'pk': response.data['id']}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        template = reshard(self.template, 0)
+        self.assertEqual((template.quantity, template.purchased_count), (2, 1))
+
 
 class MyCouponsTest(TestCase):
     """Тесты для списка купонов пользователя"""
@@ -167,9 +506,9 @@ class MyCouponsTest(TestCase):
         
         response = self.client.get(self.my_coupons_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
         # Неиспользованные должны быть первыми
-        self.assertFalse(response.data[0]['is_redeemed'])
+        self.assertFalse(response.data['results'][0]['is_redeemed'])
 
     def test_my_coupons_requires_authentication(self):
         """Тест что требуется аутентификация"""
@@ -193,7 +532,52 @@ class MyCouponsTest(TestCase):
         )
         
         response = self.client.get(self.my_coupons_url)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_my_coupons_query_count_is_constant(self):
+        """Тест что число запросов не зависит от числа купонов"""
+        other_template = CouponTemplate.objects.create(
+            partner=self.partner, category=self.category, title='Other Coupon', cost_coins=50
+        )
+        for template in (self.coupon_template, other_template) * 15:
+            UserCoupon.objects.create(user=self.user, template=template)
+
+        # Пользователь из токена и одна страница с шаблонами, партнерами и категориями
+        with self.assertNumQueries(2):
+            response = self.client.get(self.my_coupons_url)
+        self.assertEqual(len(response.data['results']), 30)
+        self.assertEqual(response.data['results'][0]['coupon_details']['partner_details']['name'], 'Test Partner')
+
+    def test_my_coupons_pages(self):
+        """Тест постраничного получения купонов по курсору"""
+        for _ in range(5):
+            UserCoupon.objects.create(user=self.user, template=self.coupon_template)
+        UserCoupon.objects.create(user=self.user, template=self.coupon_template, is_redeemed=True)
+
+        seen, url = [], f'{self.my_coupons_url}?page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen.extend(response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len({coupon['id'] for coupon in seen}), 6)
+        self.assertTrue(seen[-1]['is_redeemed'])
+
+    def test_my_coupons_sparse_and_compact(self):
+        """Тест выборочных полей и компактного режима"""
+        for _ in range(3):
+            UserCoupon.objects.create(user=self.user, template=self.coupon_template)
+
+        response = self.client.get(self.my_coupons_url, {'fields': 'id,is_redeemed'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'is_redeemed'})
+
+        response = self.client.get(self.my_coupons_url, {'compact': '1'})
+        self.assertEqual(
+            {coupon['template'] for coupon in response.data['results']},
+            {self.coupon_template.id}
+        )
+        self.assertNotIn('coupon_details', response.data['results'][0])
+        self.assertEqual(list(response.data['templates']), [self.coupon_template.id])
+        self.assertEqual(response.data['templates'][self.coupon_template.id]['title'], 'Test Coupon')
 
 
 class RedeemCouponTest(TestCase):
@@ -287,3 +671,150 @@ class RedeemCouponTest(TestCase):
         redeem_url = reverse('redeem_coupon', kwargs={'uuid': self.user_coupon.redemption_uuid})
         response = self.client.post(redeem_url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_redeem_is_single_conditional_update(self):
+        """Тест что погашение укладывается в фиксированное число запросов"""
+        refresh = RefreshToken.for_user(self.partner.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        redeem_url = reverse('redeem_coupon', kwargs={'uuid': self.user_coupon.redemption_uuid})
+        # Пользователь, партнер, UPDATE купона и статистики партнера в точке сохранения и один SELECT для ответа
+        with self.assertNumQueries(7):
+            response = self.client.post(redeem_url)
+        self.assertEqual(response.data['coupon_title'], 'Test Coupon')
+        self.assertEqual(response.data['user_email'], 'user@example.com')
+
+        response = self.client.post(reverse('redeem_coupon', kwargs={'uuid': uuid.uuid4()}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_redeem_offline_scans(self):
+        """Тест пакетного погашения офлайн-сканирований"""
+        other_partner = Partner.objects.create(
+            user=User.objects.create_user(identifier='otherpartner@example.com', is_partner=True),
+            name='Other Partner'
+        )
+        other_coupon = UserCoupon.objects.create(
+            user=self.user,
+            template=CouponTemplate.objects.create(
+                partner=other_partner, category=self.category, title='Other', cost_coins=10
+            )
+        )
+        used_coupon = UserCoupon.objects.create(
+            user=self.user, template=self.coupon_template, is_redeemed=True, redeemed_at=timezone.now()
+        )
+        scanned_at = timezone.now() - timedelta(hours=2)
+
+        refresh = RefreshToken.for_user(self.partner.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        response = self.client.post(reverse('redeem_coupon_batch'), [
+            {'uuid': str(self.user_coupon.redemption_uuid), 'scanned_at': scanned_at.isoformat()},
+            {'uuid': str(self.user_coupon.redemption_uuid)},
+            {'uuid': str(used_coupon.redemption_uuid)},
+            {'uuid': str(other_coupon.redemption_uuid)},
+            {'uuid': str(uuid.uuid4())},
+            {'uuid': 'not-a-uuid'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['redeemed', 'duplicate', 'already_redeemed', 'forbidden', 'not_found', 'error']
+        )
+
+        self.user_coupon.refresh_from_db()
+        self.assertTrue(self.user_coupon.is_redeemed)
+        self.assertEqual(self.user_coupon.redeemed_at, scanned_at)
+        other_coupon.refresh_from_db()
+        self.assertFalse(other_coupon.is_redeemed)
+
+    def test_batch_redeem_queries_do_not_grow(self):
+        """Тест что число запросов пакетного погашения не зависит от размера пакета"""
+        refresh = RefreshToken.for_user(self.partner.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        def redeem(count):
+            coupons = [UserCoupon.objects.create(user=self.user, template=self.coupon_template) for _ in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    reverse('redeem_coupon_batch'),
+                    [{'uuid': str(coupon.redemption_uuid)} for coupon in coupons],
+                    format='json'
+                )
+            self.assertTrue(all(result['status'] == 'redeemed' for result in response.data['results']))
+            return len(queries)
+
+        self.assertEqual(redeem(2), redeem(50))
+
+
+class CouponExpiryTest(TestCase):
+    """Тесты для срока действия купонов"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(identifier='user@example.com', password='testpass123')
+        self.partner = Partner.objects.create(
+            user=User.objects.create_user(identifier='partner@example.com', is_partner=True),
+            name='Test Partner'
+        )
+        category = CouponCategory.objects.create(name='Food', slug='food')
+        self.template = CouponTemplate.objects.create(
+            partner=self.partner, category=category, title='Test Coupon', cost_coins=10, validity_days=7
+        )
+        self.active = UserCoupon.objects.create(user=self.user, template=self.template)
+        self.expired = UserCoupon.objects.create(
+            user=self.user, template=self.template, expires_at=timezone.now() - timedelta(days=1)
+        )
+
+    def test_expiry_set_from_validity_days(self):
+        """Тест что срок действия считается от validity_days шаблона"""
+        self.assertAlmostEqual(
+            self.active.expires_at, self.active.purchased_at + timedelta(days=7), delta=timedelta(seconds=5)
+        )
+
+    def test_expired_coupons_hidden_from_list(self):
+        """Тест что просроченные купоны скрыты из списка по умолчанию"""
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        response = self.client.get(reverse('my_coupons'))
+        self.assertEqual([coupon['id'] for coupon in response.data['results']], [self.active.id])
+        self.assertIn('expires_at', response.data['results'][0])
+
+        response = self.client.get(reverse('my_coupons'), {'include_expired': '1'})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_cannot_redeem_expired_coupon(self):
+        """Тест что просроченный купон нельзя погасить"""
+        refresh = RefreshToken.for_user(self.partner.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        response = self.client.post(reverse('redeem_coupon', kwargs={'uuid': self.expired.redemption_uuid}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('истёк', response.data['error'])
+        self.expired.refresh_from_db()
+        self.assertFalse(self.expired.is_redeemed)
+
+        response = self.client.post(reverse('redeem_coupon_batch'), [
+            {'uuid': str(self.expired.redemption_uuid)},
+            {'uuid': str(self.active.redemption_uuid), 'scanned_at': (timezone.now() - timedelta(hours=1)).isoformat()},
+        ], format='json')
+        self.assertEqual([result['status'] for result in response.data['results']], ['expired', 'redeemed'])
+
+    def test_expire_coupons_in_chunks(self):
+        """Тест что фоновая задача помечает просроченные купоны порциями"""
+        past = timezone.now() - timedelta(hours=1)
+        UserCoupon.objects.bulk_create([
+            UserCoupon(user=self.user, template=self.template, expires_at=past) for _ in range(4)
+        ])
+        redeemed = UserCoupon.objects.create(
+            user=self.user, template=self.template, expires_at=past, is_redeemed=True, redeemed_at=past
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(expire_coupons(chunk_size=2), 5)
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries), 3)
+
+        self.assertEqual(UserCoupon.objects.filter(is_expired=True).count(), 5)
+        redeemed.refresh_from_db()
+        self.active.refresh_from_db()
+        self.assertFalse(redeemed.is_expired or self.active.is_expired)
+        self.assertEqual(expire_coupons(), 0)
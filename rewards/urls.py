@@ -1,10 +1,19 @@
 from django.urls import path
-from .views import BuyCouponView, MyCouponsListView, RedeemCouponView
+from .views import (BuyCouponView, CartCheckoutView, MyCouponsListView, CouponQRCodeView, RedeemCouponView,
+                    RedeemCouponBatchView, ReserveCouponView, ReservationView, ConfirmReservationView)
 
 urlpatterns = [
     path('buy/<int:template_id>/', BuyCouponView.as_view(), name='buy_coupon'),
+    path('checkout/', CartCheckoutView.as_view(), name='cart_checkout'),
+
+    path('reserve/<int:template_id>/', ReserveCouponView.as_view(), name='reserve_coupon'),
+    path('reservations/<int:pk>/', ReservationView.as_view(), name='reservation'),
+    path('reservations/<int:pk>/confirm/', ConfirmReservationView.as_view(), name='confirm_reservation'),
 
     path('my-coupons/', MyCouponsListView.as_view(), name='my_coupons'),
 
+    path('qr/<uuid:uuid>/', CouponQRCodeView.as_view(), name='coupon_qr'),
+
+    path('redeem/batch/', RedeemCouponBatchView.as_view(), name='redeem_coupon_batch'),
     path('redeem/<uuid:uuid>/', RedeemCouponView.as_view(), name='redeem_coupon'),
 ]
\ No newline at end of file
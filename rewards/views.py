@@ -1,19 +1,32 @@
 # rewards/views.py
-from django.utils import timezone
-from django.db import transaction
+from django.db.models import Q
+from django.http import Http404, HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 
-from .models import UserCoupon
-from .serializers import UserCouponSerializer
+from .models import StockReservation, UserCoupon
+from .qr import FORMATS, get_qr_image, qr_etag
+from .pagination import UserCouponPagination
+from .serializers import (UserCouponSerializer, UserCouponCompactSerializer, CouponScanSerializer, CartItemSerializer,
+                          StockReservationSerializer)
+from .services import (ReservationExpired, UnavailableCoupon, cancel_reservation, checkout_cart, confirm_reservation,
+                       purchase_coupon, redeem_coupon, redeem_scans, reserve_coupon)
+from idempotency.mixins import IdempotentMixin
 from partners.models import CouponTemplate
 from partners.permissions import IsPartner
+from partners.serializers import CouponTemplateSerializer
+from partners.stock import OutOfStock
+from steps_tracking.ledger import InsufficientCoins
+
+MAX_BATCH_REDEMPTIONS = 500
+MAX_CART_COUPONS = 100
 
 
-class BuyCouponView(APIView):
+class BuyCouponView(IdempotentMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, template_id):
@@ -23,52 +36,218 @@ class BuyCouponView(APIView):
         if not template.is_active:
             return Response({"error": "Этот купон недоступен."}, status=400)
 
-        if template.quantity is not None and template.quantity <= 0:
+        try:
+            user_coupon = purchase_coupon(user, template)
+        except OutOfStock:
             return Response({"error": "Купоны закончились."}, status=400)
+        except InsufficientCoins:
+            return Response({"error": "Недостаточно коинов."}, status=400)
+        return Response(
+            UserCouponSerializer(user_coupon, context={'request': request}).data,
+            status=status.HTTP_201_CREATED
+        )
+
 
-        if user.coins < template.cost_coins:
+class CartCheckoutView(IdempotentMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = CartItemSerializer(data=request.data, many=True, allow_empty=False)
+        serializer.is_valid(raise_exception=True)
+        items = [(item['template_id'], item['count']) for item in serializer.validated_data]
+
+        if sum(count for _, count in items) > MAX_CART_COUPONS:
+            return Response({"error": f"В корзине может быть не более {MAX_CART_COUPONS} купонов."}, status=400)
+
+        try:
+            coupons = checkout_cart(request.user, items)
+        except UnavailableCoupon as error:
+            return Response({"error": "Этот купон недоступен.", "template_id": error.args[0]}, status=400)
+        except OutOfStock as error:
+            return Response({"error": "Купоны закончились.", "template_id": error.args[0]}, status=400)
+        except InsufficientCoins:
             return Response({"error": "Недостаточно коинов."}, status=400)
 
-        with transaction.atomic():
-            user.coins -= template.cost_coins
-            user.save()
-            if template.quantity is not None:
-                template.quantity -= 1
-            template.purchased_count += 1
-            template.save()
-            user_coupon = UserCoupon.objects.create(user=user, template=template)
-        return Response(UserCouponSerializer(user_coupon).data, status=status.HTTP_201_CREATED)
+        return Response(
+            UserCouponSerializer(coupons, many=True, context={'request': request}).data,
+            status=status.HTTP_201_CREATED
+        )
+
+
+class ReserveCouponView(IdempotentMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, template_id):
+        template = get_object_or_404(CouponTemplate, id=template_id)
+        if not template.is_active:
+            return Response({"error": "Этот купон недоступен."}, status=400)
+
+        serializer = CartItemSerializer(data={'template_id': template_id, 'count': request.data.get('count', 1)})
+        serializer.is_valid(raise_exception=True)
+        count = serializer.validated_data['count']
+        if count > MAX_CART_COUPONS:
+            return Response({"error": f"Можно забронировать не более {MAX_CART_COUPONS} купонов."}, status=400)
+
+        try:
+            reservation = reserve_coupon(request.user, template, count)
+        except OutOfStock:
+            return Response({"error": "Купоны закончились."}, status=400)
+        return Response(StockReservationSerializer(reservation).data, status=status.HTTP_201_CREATED)
+
+
+def get_own_reservation(request, pk):
+    return get_object_or_404(StockReservation.objects.select_related('template', 'user'), pk=pk, user=request.user)
+
+
+class ReservationView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        return Response(StockReservationSerializer(get_own_reservation(request, pk)).data)
+
+    def delete(self, request, pk):
+        cancel_reservation(get_own_reservation(request, pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ConfirmReservationView(IdempotentMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        try:
+            coupons = confirm_reservation(get_own_reservation(request, pk))
+        except ReservationExpired:
+            return Response({"error": "Время брони истекло."}, status=410)
+        except UnavailableCoupon:
+            return Response({"error": "Этот купон недоступен."}, status=400)
+        except InsufficientCoins:
+            return Response({"error": "Недостаточно коинов."}, status=400)
+        return Response(
+            UserCouponSerializer(coupons, many=True, context={'request': request}).data,
+            status=status.HTTP_201_CREATED
+        )
 
 
 class MyCouponsListView(ListAPIView):
     serializer_class = UserCouponSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = UserCouponPagination
 
     def get_queryset(self):
-        return UserCoupon.objects.filter(user=self.request.user).order_by('is_redeemed', '-purchased_at')
+        coupons = UserCoupon.objects.filter(user=self.request.user).select_related(
+            'template__partner', 'template__category'
+        )
+        if self.request.query_params.get('include_expired') not in ('1', 'true'):
+            coupons = coupons.filter(Q(is_redeemed=True) | Q(expires_at__gt=timezone.now()))
+        return coupons
+
+    def is_compact(self):
+        return self.request.query_params.get('compact') in ('1', 'true')
+
+    def get_serializer_class(self):
+        return UserCouponCompactSerializer if self.is_compact() else UserCouponSerializer
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+        if self.is_compact():
+            templates = {coupon.template_id: coupon.template for coupon in page}
+            response.data['templates'] = {
+                template_id: data
+                for template_id, data in zip(
+                    templates,
+                    CouponTemplateSerializer(templates.values(), many=True, context={'request': request}).data
+                )
+            }
+        return response
+
+
+class CouponQRCodeView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    cache_control = 'private, max-age=31536000, immutable'
+
+    def get(self, request, uuid):
+        fmt = request.query_params.get('type', 'svg')
+        if fmt not in FORMATS:
+            return Response({"error": f"Unknown type, use one of: {', '.join(FORMATS)}."}, status=400)
+
+        get_object_or_404(UserCoupon.objects.only('pk'), redemption_uuid=uuid, user=request.user)
+
+        etag = qr_etag(uuid, fmt)
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(get_qr_image(uuid, fmt), content_type=FORMATS[fmt])
+        response['ETag'] = etag
+        response['Cache-Control'] = self.cache_control
+        return response
 
 
 class RedeemCouponView(APIView):
     permission_classes = [IsPartner]
 
     def post(self, request, uuid):
-        coupon = get_object_or_404(UserCoupon, redemption_uuid=uuid)
+        redeemed, coupon = redeem_coupon(request.user.partner, uuid)
+
+        if coupon is None:
+            raise Http404
+
+        if not redeemed:
+            if coupon['template__partner_id'] != request.user.partner.pk:
+                return Response({"error": "Вы не можете погасить чужой купон."}, status=403)
 
-        if coupon.template.partner != request.user.partner:
-            return Response({"error": "Вы не можете погасить чужой купон."}, status=403)
+            if not coupon['is_redeemed']:
+                return Response({
+                    "error": "Срок действия купона истёк.",
+                    "expires_at": coupon['expires_at']
+                }, status=400)
 
-        if coupon.is_redeemed:
             return Response({
                 "error": "Купон уже использован!",
-                "redeemed_at": coupon.redeemed_at
+                "redeemed_at": coupon['redeemed_at']
             }, status=400)
 
-        coupon.is_redeemed = True
-        coupon.redeemed_at = timezone.now()
-        coupon.save()
-
         return Response({
             "message": "Купон успешно принят!",
-            "coupon_title": coupon.template.title,
-            "user_email": coupon.user.email
-        })
\ No newline at end of file
+            "coupon_title": coupon['template__title'],
+            "user_email": coupon['user__email']
+        })
+
+
+class RedeemCouponBatchView(APIView):
+    permission_classes = [IsPartner]
+
+    def post(self, request):
+        if not isinstance(request.data, list):
+            return Response({"error": "Ожидается список сканирований."}, status=400)
+
+        if len(request.data) > MAX_BATCH_REDEMPTIONS:
+            return Response(
+                {"error": f"За один запрос можно передать не более {MAX_BATCH_REDEMPTIONS} сканирований."},
+                status=400
+            )
+
+        results = [None] * len(request.data)
+        scans, scan_indexes = [], []
+
+        for index, item in enumerate(request.data):
+            serializer = CouponScanSerializer(data=item)
+            if not serializer.is_valid():
+                results[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+                continue
+            scans.append((serializer.validated_data['uuid'], serializer.validated_data.get('scanned_at')))
+            scan_indexes.append(index)
+
+        outcomes = redeem_scans(request.user.partner, scans)
+        for index, (redemption_uuid, _), (outcome, coupon) in zip(scan_indexes, scans, outcomes):
+            result = {'index': index, 'uuid': redemption_uuid, 'status': outcome}
+            if coupon is not None:
+                result.update({
+                    'coupon_title': coupon['template__title'],
+                    'user_email': coupon['user__email'],
+                    'redeemed_at': coupon['redeemed_at'],
+                })
+            results[index] = result
+
+        return Response({'results': results}, status=status.HTTP_200_OK)
@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import CoinTransaction,DailyActivity
+from .models import CoinTransaction,DailyActivity,ActivitySource,ActivityRollup,IntradayStepSeries,BalanceCheckpoint,RecomputeJob
 
 admin.site.register(CoinTransaction)
-admin.site.register(DailyActivity)
\ No newline at end of file
+admin.site.register(DailyActivity)
+admin.site.register(ActivitySource)
+admin.site.register(IntradayStepSeries)
+admin.site.register(ActivityRollup)
+admin.site.register(BalanceCheckpoint)
+admin.site.register(RecomputeJob)
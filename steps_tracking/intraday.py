@@ -0,0 +1,142 @@
+from collections import defaultdict
+from zoneinfo import ZoneInfo
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .merge import DEFAULT_SOURCE
+from .models import IntradayStepSeries
+from .services import bulk_upsert_activities
+
+# Every sample is one varint of steps << 1 | flag. The flag marks a sample one minute after the previous one,
+# otherwise a varint of the minute gap follows. A walking minute takes two bytes, a quiet one a single byte.
+NEXT_MINUTE = 1
+
+
+class AppendBytes(models.Func):
+    """``column || value`` for binary columns, so an append never reads the stored blob back."""
+    arg_joiner = ' || '
+    template = '(%(expressions)s)'
+    output_field = models.BinaryField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite's || yields TEXT, cast it back to keep the column a BLOB.
+        return self.as_sql(compiler, connection, template='CAST(%(expressions)s AS BLOB)', **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='CONCAT', arg_joiner=', ',
+                           template='%(function)s(%(expressions)s)', **extra_context)
+
+
+def write_varint(out, value):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def pack_samples(samples, last_minute=-1):
+    """Encodes (minute, steps) pairs in minute order, continuing a series whose last sample was ``last_minute``."""
+    out = bytearray()
+    for minute, steps in samples:
+        if minute == last_minute + 1:
+            write_varint(out, steps << 1 | NEXT_MINUTE)
+        else:
+            write_varint(out, steps << 1)
+            write_varint(out, minute - last_minute)
+        last_minute = minute
+    return bytes(out)
+
+
+def unpack_samples(data):
+    data = bytes(data)
+    samples, position, minute = [], 0, -1
+
+    def read_varint():
+        nonlocal position
+        value = shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    while position < len(data):
+        value = read_varint()
+        minute += 1 if value & NEXT_MINUTE else read_varint()
+        samples.append((minute, value >> 1))
+    return samples
+
+
+def ingest_samples(user, samples, source_app=None):
+    """
+    Appends minute samples to the user's per-day series of ``source_app`` and
+    rolls the new steps into DailyActivity for that source.
+
+    A series only grows forward: samples at or before the last stored minute
+    of their day are skipped, which makes client retries harmless.
+    Returns {day: {'accepted': n, 'skipped': n, 'total_steps': n}}.
+    """
+    zone = ZoneInfo(user.time_zone)
+    by_day = defaultdict(dict)
+    latest = {}
+    for sample in samples:
+        moment = timezone.localtime(sample['timestamp'], zone)
+        minute = moment.hour * 60 + moment.minute
+        day_samples = by_day[moment.date()]
+        day_samples[minute] = day_samples.get(minute, 0) + sample['steps']
+        latest[moment.date()] = max(latest.get(moment.date(), moment), moment)
+
+    results = {}
+    rollup = []
+
+    with transaction.atomic():
+        series = {
+            item.day: item
+            for item in IntradayStepSeries.objects.select_for_update()
+            .filter(user=user, source_app=source_app or DEFAULT_SOURCE, day__in=list(by_day))
+            .only('pk', 'day', 'total_steps', 'last_minute')
+        }
+
+        for day, day_samples in sorted(by_day.items()):
+            current = series.get(day)
+            last_minute = current.last_minute if current else -1
+            accepted = [(minute, min(steps, 0xFFFF)) for minute, steps in sorted(day_samples.items())
+                        if minute > last_minute]
+            added_steps = sum(steps for _, steps in accepted)
+            total_steps = (current.total_steps if current else 0) + added_steps
+            results[day] = {
+                'accepted': len(accepted),
+                'skipped': len(day_samples) - len(accepted),
+                'total_steps': total_steps,
+            }
+            if not accepted:
+                continue
+
+            if current:
+                IntradayStepSeries.objects.filter(pk=current.pk).update(
+                    samples=AppendBytes(models.F('samples'), models.Value(pack_samples(accepted, last_minute))),
+                    sample_count=models.F('sample_count') + len(accepted),
+                    total_steps=models.F('total_steps') + added_steps,
+                    last_minute=accepted[-1][0],
+                    updated_at=timezone.now(),
+                )
+            else:
+                IntradayStepSeries.objects.create(
+                    user=user,
+                    day=day,
+                    source_app=source_app or DEFAULT_SOURCE,
+                    samples=pack_samples(accepted),
+                    sample_count=len(accepted),
+                    total_steps=total_steps,
+                    last_minute=accepted[-1][0],
+                )
+
+            rollup.append({'date': latest[day], 'source_app': source_app, 'steps': total_steps})
+
+        # The series total only grows, so it always wins the per-source max merge.
+        bulk_upsert_activities(user, rollup)
+
+    return results
@@ -0,0 +1,102 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import DailyActivity, RecomputeJob
+from .pipeline import MIN_STEPS_THRESHOLD, STEP_INCREMENT, apply_daily_rewards
+from .rollups import rebuild_rollups
+
+User = get_user_model()
+
+LOCK_TIMEOUT = timedelta(minutes=5)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+
+def recompute_user(user_id):
+    """Brings overall_steps, daily rewards and rollups of one user in line with their DailyActivity rows."""
+    user = User.objects.get(pk=user_id)
+    activities = DailyActivity.objects.filter(user_id=user_id)
+
+    with transaction.atomic():
+        total_steps = activities.aggregate(total=Coalesce(models.Sum('steps'), 0))['total']
+        # Same rule as calculate_daily_reward, evaluated in SQL so only mismatched days are loaded.
+        unsettled = activities.alias(
+            expected_reward=models.Case(
+                models.When(steps__lt=MIN_STEPS_THRESHOLD, then=0),
+                default=models.F('steps') / STEP_INCREMENT,
+                output_field=models.IntegerField()
+            ),
+            paid_reward=Coalesce('reward_transaction__amount', 0)
+        ).exclude(expected_reward=models.F('paid_reward'))
+
+        apply_daily_rewards(user, unsettled, overall_steps=total_steps)
+        rebuild_rollups([user_id])
+
+
+def claim_jobs(batch_size, max_attempts=None):
+    """Locks up to ``batch_size`` due jobs for this worker and returns them."""
+    max_attempts = max_attempts or settings.STEPS_RECOMPUTE_MAX_ATTEMPTS
+    now = timezone.now()
+
+    with transaction.atomic():
+        jobs = list(
+            RecomputeJob.objects.select_for_update(skip_locked=True)
+            .filter(run_after__lte=now, attempts__lt=max_attempts)
+            .filter(models.Q(locked_until__isnull=True) | models.Q(locked_until__lt=now))
+            .order_by('enqueued_at')[:batch_size]
+        )
+        RecomputeJob.objects.filter(pk__in=[job.pk for job in jobs]).update(locked_until=now + LOCK_TIMEOUT)
+    return jobs
+
+
+def run_job(job):
+    """Runs one claimed job. Returns True when it succeeded."""
+    try:
+        recompute_user(job.user_id)
+    except Exception:
+        attempts = job.attempts + 1
+        RecomputeJob.objects.filter(pk=job.pk).update(
+            attempts=attempts,
+            run_after=timezone.now() + min(timedelta(seconds=2 ** attempts), MAX_RETRY_DELAY),
+            locked_until=None,
+            last_error=traceback.format_exc()
+        )
+        return False
+
+    # A write that landed while we were running bumped the version, so the job stays queued for another pass.
+    if not RecomputeJob.objects.filter(pk=job.pk, version=job.version).delete()[0]:
+        RecomputeJob.objects.filter(pk=job.pk).update(
+            attempts=0, enqueued_at=timezone.now(), locked_until=None, last_error=''
+        )
+    return True
+
+
+def process_batch(batch_size, max_attempts=None):
+    """Claims and runs one batch. Returns (succeeded, failed) counts."""
+    succeeded = failed = 0
+    for job in claim_jobs(batch_size, max_attempts):
+        if run_job(job):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def queue_metrics(max_attempts=None):
+    max_attempts = max_attempts or settings.STEPS_RECOMPUTE_MAX_ATTEMPTS
+    now = timezone.now()
+    stats = RecomputeJob.objects.aggregate(
+        depth=models.Count('pk'),
+        running=models.Count('pk', filter=models.Q(locked_until__gte=now)),
+        retrying=models.Count('pk', filter=models.Q(attempts__gt=0, attempts__lt=max_attempts)),
+        failed=models.Count('pk', filter=models.Q(attempts__gte=max_attempts)),
+        oldest=models.Min('enqueued_at', filter=models.Q(attempts__lt=max_attempts)),
+    )
+    oldest = stats.pop('oldest')
+    stats['lag_seconds'] = (now - oldest).total_seconds() if oldest else 0.0
+    return stats
@@ -0,0 +1,142 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+
+from .models import BalanceCheckpoint, CoinTransaction
+
+User = get_user_model()
+
+
+class InsufficientCoins(Exception):
+    pass
+
+
+def change_balance(user_id, delta, allow_negative=True, **updates):
+    """
+    ``UPDATE ... SET coins = coins + delta`` for one user, together with any extra
+    column ``updates``. A debit with ``allow_negative=False`` only applies while the
+    balance covers it and raises InsufficientCoins otherwise.
+    """
+    if not delta and not updates:
+        return
+
+    users = User.objects.filter(pk=user_id)
+    if delta < 0 and not allow_negative:
+        users = users.filter(coins__gte=-delta)
+    if delta:
+        updates['coins'] = models.F('coins') + delta
+    if not users.update(**updates):
+        raise InsufficientCoins
+
+
+def apply_transactions(user, created=(), amended=(), deleted=(), allow_negative=True, **updates):
+    """
+    Writes coin transaction changes and the matching balance change atomically.
+
+    ``created`` holds unsaved CoinTransaction objects, ``amended`` holds
+    (transaction, new_amount) pairs and ``deleted`` holds stored transactions.
+    Extra ``updates`` go into the same UPDATE of the user row.
+    """
+    created, amended, deleted = list(created), list(amended), list(deleted)
+    history_deltas = {txn.pk: amount - txn.amount for txn, amount in amended}
+    history_deltas.update({txn.pk: -txn.amount for txn in deleted})
+    delta = sum(txn.amount for txn in created) + sum(history_deltas.values())
+
+    with transaction.atomic():
+        # Runs first so the user row stays locked while transactions and checkpoints change.
+        change_balance(user.pk, delta, allow_negative, **updates)
+
+        if created:
+            CoinTransaction.objects.bulk_create(created)
+        if amended:
+            for txn, amount in amended:
+                txn.amount = amount
+            CoinTransaction.objects.bulk_update([txn for txn, _ in amended], ['amount'])
+        if deleted:
+            CoinTransaction.objects.filter(pk__in=[txn.pk for txn in deleted]).delete()
+
+        shift_checkpoints(user.pk, history_deltas)
+        if created:
+            checkpoint_if_due(user.pk)
+
+    return delta
+
+
+def post_transaction(user, amount, transaction_type, reason, activity=None, allow_negative=True):
+    txn = CoinTransaction(
+        user=user,
+        amount=amount,
+        transaction_type=transaction_type,
+        reason=reason,
+        activity=activity
+    )
+    apply_transactions(user, created=[txn], allow_negative=allow_negative)
+    return txn
+
+
+def shift_checkpoints(user_id, deltas):
+    """Carries changes of already checkpointed transactions into the checkpoints that include them."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    checkpoints = list(BalanceCheckpoint.objects.filter(user_id=user_id, last_transaction_id__gte=min(deltas)))
+    for checkpoint in checkpoints:
+        checkpoint.balance += sum(delta for pk, delta in deltas.items() if pk <= checkpoint.last_transaction_id)
+    BalanceCheckpoint.objects.bulk_update(checkpoints, ['balance'])
+
+
+def checkpoint_if_due(user_id):
+    """Stores the current balance once COIN_CHECKPOINT_INTERVAL transactions passed the last checkpoint."""
+    interval = settings.COIN_CHECKPOINT_INTERVAL
+    last_checkpointed = (
+        BalanceCheckpoint.objects.filter(user_id=user_id)
+        .order_by('-last_transaction_id')
+        .values('last_transaction_id')[:1]
+    )
+    pending = list(
+        CoinTransaction.objects.filter(
+            user_id=user_id,
+            id__gt=Coalesce(models.Subquery(last_checkpointed), 0)
+        )
+        .order_by('-id')
+        .values_list('id', 'created_at')[:interval]
+    )
+    if len(pending) < interval:
+        return None
+
+    last_id, as_of = pending[0]
+    return BalanceCheckpoint.objects.create(
+        user_id=user_id,
+        balance=User.objects.values_list('coins', flat=True).get(pk=user_id),
+        last_transaction_id=last_id,
+        as_of=as_of
+    )
+
+
+def balance_as_of(user, moment):
+    """
+    The user's balance right after the last transaction created at or before ``moment``.
+    Replays only the transactions between ``moment`` and the nearest checkpoint.
+    """
+    transactions = CoinTransaction.objects.filter(user=user)
+    checkpoints = BalanceCheckpoint.objects.filter(user=user)
+
+    def total(queryset):
+        return queryset.aggregate(total=Coalesce(models.Sum('amount'), 0))['total']
+
+    checkpoint = checkpoints.filter(as_of__lte=moment).order_by('-last_transaction_id').first()
+    if checkpoint:
+        return checkpoint.balance + total(
+            transactions.filter(id__gt=checkpoint.last_transaction_id, created_at__lte=moment)
+        )
+
+    checkpoint = checkpoints.filter(as_of__gt=moment).order_by('last_transaction_id').first()
+    if checkpoint:
+        return checkpoint.balance - total(
+            transactions.filter(id__lte=checkpoint.last_transaction_id, created_at__gt=moment)
+        )
+
+    current = User.objects.values_list('coins', flat=True).get(pk=user.pk)
+    return current - total(transactions.filter(created_at__gt=moment))
@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from steps_tracking.models import DailyActivity
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Measures DailyActivity save latency for growing history sizes. All data is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[0, 100, 1000, 10000])
+        parser.add_argument('--writes', type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'history':>10} {'avg ms':>10} {'queries':>10}")
+
+        for size in options['sizes']:
+            with transaction.atomic():
+                avg_ms, queries = self.measure(size, options['writes'])
+                transaction.set_rollback(True)
+            self.stdout.write(f"{size:>10} {avg_ms:>10.3f} {queries:>10.1f}")
+
+    def measure(self, size, writes):
+        user = User.objects.create_user(identifier=f'benchmark-{time.time_ns()}@example.com')
+        start = timezone.now() - timedelta(days=size + writes)
+        DailyActivity.objects.bulk_create(
+            [
+                DailyActivity(user=user, date=start + timedelta(days=i), day=(start + timedelta(days=i)).date(), steps=7000)
+                for i in range(size)
+            ],
+            batch_size=1000
+        )
+
+        elapsed = 0.0
+        with CaptureQueriesContext(connection) as captured:
+            for i in range(writes):
+                began = time.perf_counter()
+                DailyActivity.objects.create(user=user, date=start + timedelta(days=size + i), steps=8000)
+                elapsed += time.perf_counter() - began
+
+        return elapsed * 1000 / writes, len(captured) / writes
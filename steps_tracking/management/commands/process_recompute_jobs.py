@@ -0,0 +1,73 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from steps_tracking.jobs import process_batch, queue_metrics
+from steps_tracking.models import RecomputeJob
+
+
+class Command(BaseCommand):
+    help = "Runs queued per-user recompute jobs (rewards, overall_steps, rollups) in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help="Worker threads, each with its own database connection.")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=settings.STEPS_RECOMPUTE_MAX_ATTEMPTS)
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep on an empty queue.")
+        parser.add_argument('--once', action='store_true', help="Exit as soon as the queue is drained.")
+        parser.add_argument('--retry-failed', action='store_true', help="Reset jobs that ran out of attempts.")
+        parser.add_argument('--stats', action='store_true', help="Only print queue metrics.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for name, value in queue_metrics(options['max_attempts']).items():
+                self.stdout.write(f"{name}: {value}")
+            return
+
+        if options['retry_failed']:
+            reset = RecomputeJob.objects.filter(attempts__gte=options['max_attempts']).update(attempts=0)
+            self.stdout.write(f"Reset {reset} failed jobs.")
+
+        self.lock = threading.Lock()
+        self.succeeded = self.failed = 0
+
+        try:
+            if options['workers'] > 1:
+                self.run_threads(options)
+            else:
+                self.work(options)
+        except KeyboardInterrupt:
+            self.stdout.write("Interrupted.")
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {self.succeeded} jobs, {self.failed} failed."))
+
+    def run_threads(self, options):
+        workers = [
+            threading.Thread(target=self.work_in_thread, args=(options,), daemon=True)
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def work_in_thread(self, options):
+        try:
+            self.work(options)
+        finally:
+            connection.close()
+
+    def work(self, options):
+        while True:
+            succeeded, failed = process_batch(options['batch_size'], options['max_attempts'])
+            with self.lock:
+                self.succeeded += succeeded
+                self.failed += failed
+            if succeeded or failed:
+                continue
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from steps_tracking.rollups import rebuild_rollups
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuilds weekly and monthly activity rollups from DailyActivity history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        last_id = 0
+        rebuilt = 0
+
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:options['chunk_size']]
+            )
+            if not user_ids:
+                break
+
+            with transaction.atomic():
+                rebuild_rollups(user_ids)
+
+            rebuilt += len(user_ids)
+            last_id = user_ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {rebuilt} users."))
@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from steps_tracking.models import DailyActivity
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Finds users whose overall_steps drifted from their DailyActivity history and fixes them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Only report drifted users.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+        last_id = 0
+        checked = fixed = 0
+
+        while True:
+            with transaction.atomic():
+                # Locking the chunk makes concurrent F() deltas wait for us instead of being overwritten.
+                users = list(
+                    User.objects.select_for_update()
+                    .filter(pk__gt=last_id)
+                    .order_by('pk')
+                    .only('pk', 'overall_steps')[:chunk_size]
+                )
+                if not users:
+                    break
+
+                totals = dict(
+                    DailyActivity.objects.filter(user_id__in=[user.pk for user in users])
+                    .values('user_id')
+                    .annotate(total=Sum('steps'))
+                    .values_list('user_id', 'total')
+                )
+
+                drifted = []
+                for user in users:
+                    expected = totals.get(user.pk) or 0
+                    if user.overall_steps != expected:
+                        self.stdout.write(f"User {user.pk}: {user.overall_steps} -> {expected}")
+                        user.overall_steps = expected
+                        drifted.append(user)
+
+                if drifted and not dry_run:
+                    User.objects.bulk_update(drifted, ['overall_steps'])
+
+            checked += len(users)
+            fixed += len(drifted)
+            last_id = users[-1].pk
+
+        action = "Found" if dry_run else "Fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} users. {action} {fixed} drifted."))
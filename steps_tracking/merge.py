@@ -0,0 +1,37 @@
+from django.conf import settings
+
+MERGED_FIELDS = ['steps', 'duration', 'distance_km', 'calories_burned']
+DEFAULT_SOURCE = 'manual'
+
+
+def combine_submission(stored, submitted):
+    """Health apps report running daily totals, so one source keeps its largest reading per field."""
+    if stored is None:
+        return dict(submitted)
+    return {field: max(stored[field], submitted[field]) for field in MERGED_FIELDS}
+
+
+def merge_max(sources):
+    return {field: max(values[field] for values in sources.values()) for field in MERGED_FIELDS}
+
+
+def merge_sum(sources):
+    return {field: sum(values[field] for values in sources.values()) for field in MERGED_FIELDS}
+
+
+def merge_priority(sources):
+    priority = settings.ACTIVITY_SOURCE_PRIORITY
+    best = min(sources, key=lambda source: priority.index(source) if source in priority else len(priority))
+    return dict(sources[best])
+
+
+MERGE_POLICIES = {
+    'max': merge_max,
+    'sum': merge_sum,
+    'priority': merge_priority,
+}
+
+
+def merge_sources(sources):
+    """Collapses {source_app: values} for one day into the values stored on DailyActivity."""
+    return MERGE_POLICIES[settings.ACTIVITY_MERGE_POLICY](sources)
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def link_reward_transactions(apps, schema_editor):
+    DailyActivity = apps.get_model('steps_tracking', 'DailyActivity')
+    CoinTransaction = apps.get_model('steps_tracking', 'CoinTransaction')
+
+    last_id = 0
+    while True:
+        activities = list(
+            DailyActivity.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'user_id', 'date')[:BACKFILL_CHUNK_SIZE]
+        )
+        if not activities:
+            break
+        last_id = activities[-1][0]
+
+        # Rewards used to be matched by this exact reason string.
+        by_reason = {(user_id, f"Daily Steps Reward ({date})"): pk for pk, user_id, date in activities}
+        transactions = list(CoinTransaction.objects.filter(
+            activity__isnull=True,
+            transaction_type='EARNED',
+            user_id__in={user_id for _, user_id, _ in activities},
+            reason__in={reason for _, reason in by_reason},
+        ))
+
+        linked = []
+        for txn in transactions:
+            activity_id = by_reason.get((txn.user_id, txn.reason))
+            if activity_id is not None:
+                txn.activity_id = activity_id
+                linked.append(txn)
+        CoinTransaction.objects.bulk_update(linked, ['activity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steps_tracking', '0002_alter_dailyactivity_duration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cointransaction',
+            name='activity',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reward_transaction', to='steps_tracking.dailyactivity'),
+        ),
+        migrations.RunPython(link_reward_transactions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steps_tracking', '0003_cointransaction_activity'),
+        ('users', '0003_customuser_time_zone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivitySource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_app', models.CharField(choices=[('apple_health', 'Apple Health'), ('google_fit', 'Google Fit'), ('manual', 'Manual')], max_length=50)),
+                ('steps', models.PositiveIntegerField(default=0)),
+                ('duration', models.PositiveIntegerField(default=0)),
+                ('distance_km', models.FloatField(default=0.0)),
+                ('calories_burned', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sources', to='steps_tracking.dailyactivity')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('activity', 'source_app'), name='unique_activity_source')],
+            },
+        ),
+        migrations.AddField(
+            model_name='dailyactivity',
+            name='day',
+            field=models.DateField(null=True),
+        ),
+    ]
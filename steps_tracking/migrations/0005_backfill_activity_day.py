@@ -0,0 +1,138 @@
+from zoneinfo import ZoneInfo
+
+from django.db import migrations
+from django.db.models import Count, F
+from django.utils import timezone
+
+CHUNK_SIZE = 1000
+MERGED_FIELDS = ('steps', 'duration', 'distance_km', 'calories_burned')
+
+# Reward rules at the time of this migration.
+MIN_STEPS_THRESHOLD = 5000
+STEP_INCREMENT = 1000
+
+
+def daily_reward(steps):
+    if steps < MIN_STEPS_THRESHOLD:
+        return 0
+    return int(steps / STEP_INCREMENT)
+
+
+def local_day(activity):
+    if timezone.is_naive(activity.date):
+        return activity.date.date()
+    return timezone.localtime(activity.date, ZoneInfo(activity.user.time_zone)).date()
+
+
+def fill_days(DailyActivity):
+    last_id = 0
+    while True:
+        chunk = list(
+            DailyActivity.objects.filter(pk__gt=last_id).select_related('user').order_by('pk')[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1].pk
+
+        for activity in chunk:
+            activity.day = local_day(activity)
+        DailyActivity.objects.bulk_update(chunk, ['day'])
+
+
+def merge_duplicate_days(apps):
+    """Folds same-day rows into the oldest one, keeping the per-source maximum of every field."""
+    User = apps.get_model('users', 'CustomUser')
+    DailyActivity = apps.get_model('steps_tracking', 'DailyActivity')
+    ActivitySource = apps.get_model('steps_tracking', 'ActivitySource')
+    CoinTransaction = apps.get_model('steps_tracking', 'CoinTransaction')
+
+    duplicates = list(
+        DailyActivity.objects.values('user_id', 'day').annotate(rows=Count('id')).filter(rows__gt=1)
+    )
+    for group in duplicates:
+        rows = list(DailyActivity.objects.filter(user_id=group['user_id'], day=group['day']).order_by('pk'))
+        keep, extra = rows[0], rows[1:]
+
+        sources = {}
+        for row in rows:
+            values = sources.setdefault(row.source_app or 'manual', dict.fromkeys(MERGED_FIELDS, 0))
+            for field in MERGED_FIELDS:
+                values[field] = max(values[field], getattr(row, field))
+        merged = {field: max(values[field] for values in sources.values()) for field in MERGED_FIELDS}
+
+        rewards = {txn.activity_id: txn for txn in CoinTransaction.objects.filter(activity__in=rows)}
+        old_reward = sum(txn.amount for txn in rewards.values())
+        new_reward = daily_reward(merged['steps'])
+
+        for row in extra:
+            if row.pk in rewards:
+                rewards[row.pk].delete()
+        kept_txn = rewards.get(keep.pk)
+        if new_reward and kept_txn:
+            kept_txn.amount = new_reward
+            kept_txn.save(update_fields=['amount'])
+        elif new_reward:
+            CoinTransaction.objects.create(
+                user_id=keep.user_id,
+                amount=new_reward,
+                transaction_type='EARNED',
+                reason=f"Daily Steps Reward ({keep.date})",
+                activity=keep,
+            )
+        elif kept_txn:
+            kept_txn.delete()
+
+        User.objects.filter(pk=keep.user_id).update(
+            coins=F('coins') + new_reward - old_reward,
+            overall_steps=F('overall_steps') + merged['steps'] - sum(row.steps for row in rows),
+        )
+
+        DailyActivity.objects.filter(pk__in=[row.pk for row in extra]).delete()
+        for field, value in merged.items():
+            setattr(keep, field, value)
+        keep.save(update_fields=list(MERGED_FIELDS))
+
+        ActivitySource.objects.bulk_create([
+            ActivitySource(activity=keep, source_app=source_app, **values)
+            for source_app, values in sources.items()
+        ])
+
+
+def create_sources(DailyActivity, ActivitySource):
+    last_id = 0
+    while True:
+        chunk = list(
+            DailyActivity.objects.filter(pk__gt=last_id, sources__isnull=True).order_by('pk')[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1].pk
+
+        ActivitySource.objects.bulk_create([
+            ActivitySource(
+                activity=activity,
+                source_app=activity.source_app or 'manual',
+                **{field: getattr(activity, field) for field in MERGED_FIELDS}
+            )
+            for activity in chunk
+        ])
+
+
+def backfill_activity_days(apps, schema_editor):
+    DailyActivity = apps.get_model('steps_tracking', 'DailyActivity')
+    ActivitySource = apps.get_model('steps_tracking', 'ActivitySource')
+
+    fill_days(DailyActivity)
+    merge_duplicate_days(apps)
+    create_sources(DailyActivity, ActivitySource)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steps_tracking', '0004_activitysource_dailyactivity_day'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_activity_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steps_tracking', '0005_backfill_activity_day'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyactivity',
+            name='day',
+            field=models.DateField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyactivity',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyactivity',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='unique_user_activity_day'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steps_tracking', '0006_alter_dailyactivity_day_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntradayStepSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('samples', models.BinaryField(default=bytes)),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('total_steps', models.PositiveIntegerField(default=0)),
+                ('last_minute', models.SmallIntegerField(default=-1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='intraday_series', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Intraday Step Series',
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='unique_user_intraday_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+CHUNK_SIZE = 500
+ROLLED_UP_FIELDS = ('steps', 'duration', 'distance_km', 'calories_burned')
+
+
+def build_rollups(apps, schema_editor):
+    User = apps.get_model('users', 'CustomUser')
+    DailyActivity = apps.get_model('steps_tracking', 'DailyActivity')
+    ActivityRollup = apps.get_model('steps_tracking', 'ActivityRollup')
+
+    last_id = 0
+    while True:
+        user_ids = list(User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:CHUNK_SIZE])
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+
+        rows = []
+        for period, trunc in (('week', TruncWeek), ('month', TruncMonth)):
+            totals = (
+                DailyActivity.objects.filter(user_id__in=user_ids)
+                .annotate(period_start=trunc('day'))
+                .values('user_id', 'period_start')
+                .annotate(total_days=Count('id'), **{f'total_{field}': Sum(field) for field in ROLLED_UP_FIELDS})
+                .order_by()
+            )
+            rows.extend(
+                ActivityRollup(
+                    user_id=total['user_id'],
+                    period=period,
+                    period_start=total['period_start'],
+                    active_days=total['total_days'],
+                    **{field: total[f'total_{field}'] for field in ROLLED_UP_FIELDS}
+                )
+                for total in totals
+            )
+        ActivityRollup.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steps_tracking', '0007_intradaystepseries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('steps', models.BigIntegerField(default=0)),
+                ('duration', models.BigIntegerField(default=0)),
+                ('distance_km', models.FloatField(default=0.0)),
+                ('calories_burned', models.BigIntegerField(default=0)),
+                ('active_days', models.PositiveSmallIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['period_start'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'period', 'period_start'), name='unique_user_activity_rollup')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steps_tracking', '0008_activityrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cointransaction',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='txn_user_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyactivity',
+            index=models.Index(fields=['user', '-date', '-id'], name='activity_user_date_id_idx'),
+        ),
+    ]
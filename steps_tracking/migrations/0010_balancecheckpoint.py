@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steps_tracking', '0009_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.IntegerField()),
+                ('last_transaction_id', models.BigIntegerField()),
+                ('as_of', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_transaction_id'],
+                'indexes': [models.Index(fields=['user', 'last_transaction_id'], name='checkpoint_user_txn_idx'), models.Index(fields=['user', 'as_of'], name='checkpoint_user_as_of_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steps_tracking', '0011_recomputejob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='intradaystepseries',
+            name='unique_user_intraday_day',
+        ),
+        migrations.AddField(
+            model_name='intradaystepseries',
+            name='source_app',
+            field=models.CharField(choices=[('apple_health', 'Apple Health'), ('google_fit', 'Google Fit'), ('manual', 'Manual')], default='manual', max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='intradaystepseries',
+            constraint=models.UniqueConstraint(fields=('user', 'day', 'source_app'), name='unique_user_intraday_day_source'),
+        ),
+    ]
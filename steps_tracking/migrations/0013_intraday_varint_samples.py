@@ -0,0 +1,59 @@
+import sys
+from array import array
+
+from django.db import migrations
+
+CHUNK_SIZE = 1000
+
+
+# Sample encodings at the time of this migration.
+def unpack_uint16_pairs(data):
+    packed = array('H')
+    packed.frombytes(bytes(data))
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return list(zip(packed[::2], packed[1::2]))
+
+
+def write_varint(out, value):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def pack_varints(samples):
+    out, last_minute = bytearray(), -1
+    for minute, steps in samples:
+        if minute == last_minute + 1:
+            write_varint(out, steps << 1 | 1)
+        else:
+            write_varint(out, steps << 1)
+            write_varint(out, minute - last_minute)
+        last_minute = minute
+    return bytes(out)
+
+
+def reencode_samples(apps, schema_editor):
+    IntradayStepSeries = apps.get_model('steps_tracking', 'IntradayStepSeries')
+    last_id = 0
+    while True:
+        chunk = list(IntradayStepSeries.objects.filter(pk__gt=last_id).order_by('pk').only('pk', 'samples')[:CHUNK_SIZE])
+        if not chunk:
+            break
+        last_id = chunk[-1].pk
+
+        for series in chunk:
+            series.samples = pack_varints(unpack_uint16_pairs(series.samples))
+        IntradayStepSeries.objects.bulk_update(chunk, ['samples'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steps_tracking', '0012_intraday_series_source'),
+    ]
+
+    operations = [
+        migrations.RunPython(reencode_samples, migrations.RunPython.noop),
+    ]
@@ -4,26 +4,116 @@ from django.utils import timezone
 from datetime import timedelta
 
 
+# Fields whose stored values signals compare against to apply deltas
+TRACKED_FIELDS = ['day', 'steps', 'duration', 'distance_km', 'calories_burned']
+
+SOURCE_APP_CHOICES = [('apple_health', 'Apple Health'),
+                      ('google_fit', 'Google Fit'),
+                      ('manual', 'Manual')]
+
+
 class DailyActivity(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='activities')
     date = models.DateTimeField(default=timezone.now)
+    day = models.DateField()
     steps = models.PositiveIntegerField(default=0)
     duration = models.PositiveIntegerField(default=0)
     distance_km = models.FloatField(default=0.0)
     calories_burned = models.PositiveIntegerField(default=0)
-    source_app = models.CharField(max_length=50, blank=True, null=True,
-                                  choices=[('apple_health', 'Apple Health'),
-                                           ('google_fit', 'Google Fit'),
-                                           ('manual', 'Manual')])
+    source_app = models.CharField(max_length=50, blank=True, null=True, choices=SOURCE_APP_CHOICES)
 
     class Meta:
         ordering = ['-date']
-        unique_together = ('user', 'date')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_user_activity_day'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-date', '-id'], name='activity_user_date_id_idx'),
+        ]
         verbose_name_plural = 'Daily Activities'
 
     def __str__(self):
         return f"{self.user} - {self.date}: {self.steps} steps"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so signals can apply deltas instead of re-aggregating
+        if all(field in instance.__dict__ for field in TRACKED_FIELDS):
+            instance._loaded_values = {field: getattr(instance, field) for field in TRACKED_FIELDS}
+        return instance
+
+    def tracked_values(self):
+        return {field: getattr(self, field) for field in TRACKED_FIELDS}
+
+    def save(self, *args, **kwargs):
+        if self.day is None:
+            self.day = self.user.local_date(self.date)
+        super().save(*args, **kwargs)
+
+
+class ActivitySource(models.Model):
+    activity = models.ForeignKey(DailyActivity, on_delete=models.CASCADE, related_name='sources')
+    source_app = models.CharField(max_length=50, choices=SOURCE_APP_CHOICES)
+    steps = models.PositiveIntegerField(default=0)
+    duration = models.PositiveIntegerField(default=0)
+    distance_km = models.FloatField(default=0.0)
+    calories_burned = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['activity', 'source_app'], name='unique_activity_source'),
+        ]
+
+    def __str__(self):
+        return f"{self.activity} ({self.source_app})"
+
+
+class ActivityRollup(models.Model):
+    class Period(models.TextChoices):
+        WEEK = ('week', 'Week')
+        MONTH = ('month', 'Month')
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='activity_rollups')
+    period = models.CharField(max_length=5, choices=Period.choices)
+    period_start = models.DateField()
+    steps = models.BigIntegerField(default=0)
+    duration = models.BigIntegerField(default=0)
+    distance_km = models.FloatField(default=0.0)
+    calories_burned = models.BigIntegerField(default=0)
+    active_days = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ['period_start']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period', 'period_start'], name='unique_user_activity_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.period} of {self.period_start}: {self.steps} steps"
+
+
+class IntradayStepSeries(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='intraday_series')
+    day = models.DateField()
+    # Every source keeps its own series, so its total feeds only its own ActivitySource
+    source_app = models.CharField(max_length=50, choices=SOURCE_APP_CHOICES, default='manual')
+    samples = models.BinaryField(default=bytes)
+    sample_count = models.PositiveIntegerField(default=0)
+    total_steps = models.PositiveIntegerField(default=0)
+    last_minute = models.SmallIntegerField(default=-1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'source_app'], name='unique_user_intraday_day_source'),
+        ]
+        verbose_name_plural = 'Intraday Step Series'
+
+    def __str__(self):
+        return f"{self.user} - {self.day} ({self.source_app}): {self.sample_count} samples"
+
 
 class CoinTransaction(models.Model):
     class TransactionType(models.TextChoices):
@@ -35,10 +125,59 @@ class CoinTransaction(models.Model):
     amount = models.IntegerField()
     transaction_type = models.CharField(max_length=10, choices=TransactionType.choices)
     reason = models.CharField(max_length=255)
+    activity = models.OneToOneField(DailyActivity, on_delete=models.SET_NULL, blank=True, null=True,
+                                    related_name='reward_transaction')
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='txn_user_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.amount} coins ({self.transaction_type})"
+
+
+class BalanceCheckpoint(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    balance = models.IntegerField()
+    last_transaction_id = models.BigIntegerField()
+    as_of = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-last_transaction_id']
+        indexes = [
+            models.Index(fields=['user', 'last_transaction_id'], name='checkpoint_user_txn_idx'),
+            models.Index(fields=['user', 'as_of'], name='checkpoint_user_as_of_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.balance} coins as of {self.as_of}"
+
+
+class RecomputeJob(models.Model):
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='recompute_job')
+    version = models.PositiveIntegerField(default=1)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    enqueued_at = models.DateTimeField(default=timezone.now)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_after'], name='recompute_job_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"Recompute {self.user} (v{self.version}, {self.attempts} attempts)"
+
+    @classmethod
+    def enqueue(cls, user_id):
+        # Repeated writes coalesce into the pending job; the version bump tells a running worker to go again.
+        # New data earns a failed job a fresh set of attempts, so later writes are never stranded behind it.
+        if not cls.objects.filter(user_id=user_id).update(
+            version=models.F('version') + 1, attempts=0, run_after=timezone.now(), last_error=''
+        ):
+            cls.objects.bulk_create([cls(user_id=user_id)], ignore_conflicts=True)
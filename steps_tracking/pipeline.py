@@ -0,0 +1,97 @@
+from django.db import models
+
+from .ledger import apply_transactions, change_balance
+from .models import CoinTransaction
+from .rollups import apply_rollup_deltas, rollup_deltas
+
+MIN_STEPS_THRESHOLD = 5000
+STEP_INCREMENT = 1000
+COIN_PER_INCREMENT = 1
+
+
+def calculate_daily_reward(steps):
+    if steps < MIN_STEPS_THRESHOLD:
+        return 0
+
+    return int(steps / STEP_INCREMENT)
+
+
+def reward_reason(date):
+    return f"Daily Steps Reward ({date})"
+
+
+def reward_changes(user, activities, existing=None):
+    """
+    Compares the EARNED transactions of ``activities`` with their step counts.
+    Returns the ledger changes as keyword arguments for ``apply_transactions``.
+    ``existing`` maps activity ids to their transactions when the caller already knows them.
+    """
+    activities = list(activities)
+    if existing is None:
+        existing = {
+            txn.activity_id: txn
+            for txn in CoinTransaction.objects.filter(activity__in=[activity.pk for activity in activities]).order_by()
+        }
+
+    to_create, to_amend, to_delete = [], [], []
+
+    for activity in activities:
+        new_reward = calculate_daily_reward(activity.steps)
+        existing_txn = existing.get(activity.pk)
+        old_reward = existing_txn.amount if existing_txn else 0
+
+        if new_reward == old_reward:
+            continue
+
+        if new_reward == 0:
+            to_delete.append(existing_txn)
+        elif existing_txn:
+            to_amend.append((existing_txn, new_reward))
+        else:
+            to_create.append(CoinTransaction(
+                user=user,
+                amount=new_reward,
+                transaction_type=CoinTransaction.TransactionType.EARNED,
+                reason=reward_reason(activity.date),
+                activity=activity
+            ))
+
+    return {'created': to_create, 'amended': to_amend, 'deleted': to_delete}
+
+
+def apply_daily_rewards(user, activities, **updates):
+    """
+    Brings the EARNED transactions of ``activities`` in line with their step
+    counts through the ledger and returns the resulting change of the user's
+    coin balance. ``updates`` are written in the same UPDATE of the user row.
+    """
+    return apply_transactions(user, **reward_changes(user, activities), **updates)
+
+
+def apply_activity_change(activity, previous, created):
+    """
+    Derives everything one saved DailyActivity affects: its reward, the user's
+    coins and overall_steps, and the rollups. ``previous`` holds the tracked
+    values before the save. All user fields change in a single UPDATE.
+    """
+    current = activity.tracked_values()
+    user = activity.user
+
+    changes = {}
+    if created:
+        # A new row cannot have a reward transaction yet.
+        changes = reward_changes(user, [activity], existing={})
+    elif previous is None or calculate_daily_reward(previous['steps']) != calculate_daily_reward(current['steps']):
+        changes = reward_changes(user, [activity])
+
+    updates = {}
+    steps_delta = current['steps'] - (previous['steps'] if previous else 0)
+    if steps_delta:
+        updates['overall_steps'] = models.F('overall_steps') + steps_delta
+
+    if any(changes.values()):
+        apply_transactions(user, **changes, **updates)
+    elif updates:
+        change_balance(user.pk, 0, **updates)
+
+    apply_rollup_deltas(activity.user_id, rollup_deltas([(previous, current)]))
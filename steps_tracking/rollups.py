@@ -0,0 +1,105 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Sum, Count
+from django.db.models.functions import TruncWeek, TruncMonth
+
+from .merge import MERGED_FIELDS
+from .models import ActivityRollup, DailyActivity
+
+ROLLUP_FIELDS = MERGED_FIELDS + ['active_days']
+PERIOD_TRUNCATIONS = {
+    ActivityRollup.Period.WEEK: TruncWeek,
+    ActivityRollup.Period.MONTH: TruncMonth,
+}
+
+
+def period_start(period, day):
+    if period == ActivityRollup.Period.WEEK:
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period_start(period, start):
+    if period == ActivityRollup.Period.WEEK:
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def previous_period_start(period, start):
+    if period == ActivityRollup.Period.WEEK:
+        return start - timedelta(days=7)
+    return (start - timedelta(days=1)).replace(day=1)
+
+
+def rollup_deltas(changes):
+    """
+    Turns (old_values, new_values) pairs of DailyActivity tracked values into
+    per-(period, period_start) deltas. Either side may be None for creates and deletes.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+    for old, new in changes:
+        for values, sign in ((old, -1), (new, 1)):
+            if not values:
+                continue
+            for period in PERIOD_TRUNCATIONS:
+                bucket = deltas[(period, period_start(period, values['day']))]
+                for field in MERGED_FIELDS:
+                    bucket[field] += sign * values[field]
+                bucket['active_days'] += sign
+    return {key: delta for key, delta in deltas.items() if any(delta.values())}
+
+
+def apply_rollup_deltas(user_id, deltas):
+    if not deltas:
+        return
+
+    # Signals call this on plain saves too, outside any transaction; the row locks need one.
+    with transaction.atomic(savepoint=False):
+        # Create missing buckets first so the locked read below sees every row it has to change.
+        ActivityRollup.objects.bulk_create(
+            [ActivityRollup(user_id=user_id, period=period, period_start=start) for period, start in deltas],
+            ignore_conflicts=True
+        )
+        rows = ActivityRollup.objects.select_for_update().filter(
+            user_id=user_id,
+            period__in={period for period, _ in deltas},
+            period_start__in={start for _, start in deltas},
+        )
+
+        changed = []
+        for row in rows:
+            delta = deltas.get((row.period, row.period_start))
+            if delta is None:
+                continue
+            for field, value in delta.items():
+                setattr(row, field, getattr(row, field) + value)
+            changed.append(row)
+        ActivityRollup.objects.bulk_update(changed, ROLLUP_FIELDS)
+
+
+def rebuild_rollups(user_ids):
+    """Recomputes the rollups of ``user_ids`` from their DailyActivity history."""
+    ActivityRollup.objects.filter(user_id__in=user_ids).delete()
+
+    rows = []
+    for period, trunc in PERIOD_TRUNCATIONS.items():
+        totals = (
+            DailyActivity.objects.filter(user_id__in=user_ids)
+            .annotate(period_start=trunc('day'))
+            .values('user_id', 'period_start')
+            .annotate(total_days=Count('id'), **{f'total_{field}': Sum(field) for field in MERGED_FIELDS})
+            .order_by()
+        )
+        rows.extend(
+            ActivityRollup(
+                user_id=total['user_id'],
+                period=period,
+                period_start=total['period_start'],
+                active_days=total['total_days'],
+                **{field: total[f'total_{field}'] for field in MERGED_FIELDS}
+            )
+            for total in totals
+        )
+    ActivityRollup.objects.bulk_create(rows)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import DailyActivity, CoinTransaction
+from .models import DailyActivity, CoinTransaction, ActivityRollup, SOURCE_APP_CHOICES
 
 
 class DailyActivitySerializer(serializers.ModelSerializer):
@@ -10,19 +10,33 @@ class DailyActivitySerializer(serializers.ModelSerializer):
         fields = ['id',
                   'user',
                   'date',
+                  'day',
                   'duration',
                   'steps',
                   'distance_km',
                   'calories_burned',
                   'source_app'
                   ]
-        read_only_fields = ['user']
-
-        # Убрали валидатор, так как unique_together уже определен в модели
-        # и Django автоматически проверяет уникальность на уровне БД
+        read_only_fields = ['user', 'day']
 
 
 class CoinTransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = CoinTransaction
         fields = ['amount', 'transaction_type', 'reason', 'created_at']
+
+
+class ActivityRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ActivityRollup
+        fields = ['period_start', 'steps', 'duration', 'distance_km', 'calories_burned', 'active_days']
+
+
+class IntradaySampleSerializer(serializers.Serializer):
+    timestamp = serializers.DateTimeField()
+    steps = serializers.IntegerField(min_value=0, max_value=65535)
+
+
+class IntradayIngestSerializer(serializers.Serializer):
+    source_app = serializers.ChoiceField(choices=SOURCE_APP_CHOICES, required=False, allow_null=True)
+    samples = IntradaySampleSerializer(many=True, allow_empty=False, max_length=7 * 24 * 60)
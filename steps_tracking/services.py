@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.utils import timezone
+
+from .merge import DEFAULT_SOURCE, MERGED_FIELDS, combine_submission, merge_sources
+from .models import DailyActivity, ActivitySource, RecomputeJob
+from .pipeline import apply_daily_rewards
+from .rollups import apply_rollup_deltas, rollup_deltas
+
+User = get_user_model()
+
+
+def upsert_results(days, activities, existing):
+    """Only the first item of a new day created its row, later items of that day were merged into it."""
+    seen = set(existing)
+    results = []
+    for day in days:
+        results.append((activities[day], day not in seen))
+        seen.add(day)
+    return results
+
+
+def bulk_upsert_activities(user, items):
+    """
+    Upserts a batch of validated activity dicts for one user.
+
+    Items are bucketed by the user's local day and merged per source_app, so
+    every day ends up as a single DailyActivity row. Rows are written with
+    INSERT ... ON CONFLICT, so the per-row post_save receivers do not fire;
+    rewards and overall_steps are recomputed once for the whole batch instead,
+    or left to a queued RecomputeJob when STEPS_RECOMPUTE_ASYNC is on.
+    Returns a list of (activity, created) pairs in the order of ``items``.
+    """
+    if not items:
+        return []
+
+    moments = [item.get('date') or timezone.now() for item in items]
+    days = [user.local_date(moment) for moment in moments]
+
+    with transaction.atomic():
+        # Row locks only cover days that exist, so a first sync from two sources would both start from zero.
+        # Locking the user first makes concurrent batches read each other's rows instead.
+        User.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True).get()
+        existing = {
+            activity.day: activity
+            for activity in DailyActivity.objects.select_for_update()
+            .filter(user=user, day__in=days)
+            .prefetch_related('sources')
+        }
+
+        sources = {}
+        for day, activity in existing.items():
+            sources[day] = {
+                source.source_app: {field: getattr(source, field) for field in MERGED_FIELDS}
+                for source in activity.sources.all()
+            } or {
+                activity.source_app or DEFAULT_SOURCE: {field: getattr(activity, field) for field in MERGED_FIELDS}
+            }
+
+        first_seen, last_source = {}, {}
+        for item, moment, day in zip(items, moments, days):
+            source_app = item.get('source_app') or DEFAULT_SOURCE
+            submitted = {field: item.get(field, 0) for field in MERGED_FIELDS}
+            day_sources = sources.setdefault(day, {})
+            day_sources[source_app] = combine_submission(day_sources.get(source_app), submitted)
+            first_seen.setdefault(day, moment)
+            last_source[day] = item.get('source_app')
+
+        DailyActivity.objects.bulk_create(
+            [
+                DailyActivity(
+                    user=user,
+                    day=day,
+                    date=existing[day].date if day in existing else first_seen[day],
+                    source_app=last_source[day],
+                    **merge_sources(day_sources)
+                )
+                for day, day_sources in sources.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'day'],
+            update_fields=MERGED_FIELDS + ['source_app'],
+        )
+
+        activities = {
+            activity.day: activity
+            for activity in DailyActivity.objects.filter(user=user, day__in=days)
+        }
+
+        ActivitySource.objects.bulk_create(
+            [
+                ActivitySource(activity=activities[day], source_app=source_app, **values)
+                for day, day_sources in sources.items()
+                for source_app, values in day_sources.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['activity', 'source_app'],
+            update_fields=MERGED_FIELDS + ['updated_at'],
+        )
+
+        if settings.STEPS_RECOMPUTE_ASYNC:
+            RecomputeJob.enqueue(user.pk)
+            return upsert_results(days, activities, existing)
+
+        apply_rollup_deltas(user.pk, rollup_deltas(
+            (existing[day].tracked_values() if day in existing else None, activity.tracked_values())
+            for day, activity in activities.items()
+        ))
+
+        steps_delta = (
+            sum(activity.steps for activity in activities.values())
+            - sum(activity.steps for activity in existing.values())
+        )
+        apply_daily_rewards(user, activities.values(), overall_steps=models.F('overall_steps') + steps_delta)
+
+    return upsert_results(days, activities, existing)
+
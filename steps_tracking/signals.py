@@ -1,71 +1,47 @@
 # steps_tracking/signals.py
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.db import models
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import DailyActivity, CoinTransaction
+from .models import DailyActivity, RecomputeJob, TRACKED_FIELDS
+from .pipeline import apply_activity_change
+from .rollups import apply_rollup_deltas, rollup_deltas
 
 User = get_user_model()
 
-MIN_STEPS_THRESHOLD = 5000
-STEP_INCREMENT = 1000
-COIN_PER_INCREMENT = 1
 
-
-def calculate_daily_reward(steps):
-    if steps < MIN_STEPS_THRESHOLD:
-        return 0
-
-    return int(steps / STEP_INCREMENT)
+@receiver(pre_save, sender=DailyActivity)
+def remember_previous_values(sender, instance, **kwargs):
+    if instance._state.adding or hasattr(instance, '_loaded_values'):
+        return
+    instance._loaded_values = DailyActivity.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS).first()
 
 
 @receiver(post_save, sender=DailyActivity)
-def handle_daily_reward(sender, instance, **kwargs):
-    user = instance.user
-    date = instance.date
-
-    new_reward = calculate_daily_reward(instance.steps)
+def update_derived_fields(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_loaded_values', None)
+    instance._loaded_values = instance.tracked_values()
 
-    reason_string = f"Daily Steps Reward ({date})"
+    if settings.STEPS_RECOMPUTE_ASYNC:
+        RecomputeJob.enqueue(instance.user_id)
+        return
 
-    try:
-        existing_txn = CoinTransaction.objects.get(
-            user=user,
-            reason=reason_string,
-            transaction_type=CoinTransaction.TransactionType.EARNED
-        )
-        old_reward = existing_txn.amount
-    except CoinTransaction.DoesNotExist:
-        existing_txn = None
-        old_reward = 0
+    apply_activity_change(instance, previous, created)
 
-    difference = new_reward - old_reward
 
-    if difference == 0:
+@receiver(post_delete, sender=DailyActivity)
+def subtract_deleted_activity(sender, instance, origin=None, **kwargs):
+    # Nothing to maintain when the activity goes away together with its user.
+    if isinstance(origin, User) or getattr(origin, 'model', None) is User:
         return
 
-    user.coins += difference
-    user.save(update_fields=['coins'])
+    if settings.STEPS_RECOMPUTE_ASYNC:
+        RecomputeJob.enqueue(instance.user_id)
+        return
 
-    if new_reward == 0:
-        if existing_txn:
-            existing_txn.delete()
-    elif existing_txn:
-        existing_txn.amount = new_reward
-        existing_txn.save(update_fields=['amount'])
-    else:
-        CoinTransaction.objects.create(
-            user=user,
-            amount=new_reward,
-            transaction_type=CoinTransaction.TransactionType.EARNED,
-            reason=reason_string
-        )
+    stored = getattr(instance, '_loaded_values', None) or instance.tracked_values()
+    if stored['steps']:
+        User.objects.filter(pk=instance.user_id).update(overall_steps=models.F('overall_steps') - stored['steps'])
 
-@receiver(post_save, sender=DailyActivity)
-def update_user_overall_steps(sender, instance, **kwargs):
-    user = instance.user
-    total_steps = DailyActivity.objects.filter(user=user).aggregate(
-        total=models.Sum('steps')
-    )['total'] or 0
-    user.overall_steps = total_steps
-    user.save(update_fields=['overall_steps'])
\ No newline at end of file
+    apply_rollup_deltas(instance.user_id, rollup_deltas([(stored, None)]))
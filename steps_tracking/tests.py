@@ -1,16 +1,40 @@
-from django.test import TestCase
+import threading
+import time
+
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from datetime import timedelta
-from .models import DailyActivity, CoinTransaction
+from io import StringIO
+from unittest import mock
+from .intraday import unpack_samples
+from .jobs import process_batch
+from .ledger import InsufficientCoins, balance_as_of, post_transaction
+from .models import (DailyActivity, ActivitySource, CoinTransaction, IntradayStepSeries, ActivityRollup,
+                     BalanceCheckpoint, RecomputeJob)
+from .services import bulk_upsert_activities
 
 User = get_user_model()
 
 
+def retry_on_lock(action):
+    while True:
+        try:
+            return action()
+        except OperationalError:
+            # SQLite allows one writer at a time; other databases wait on row locks instead
+            time.sleep(0.001)
+
+
 class DailyActivityTest(TestCase):
     """Тесты для DailyActivity"""
 
@@ -58,7 +82,7 @@ class DailyActivityTest(TestCase):
         )
         response = self.client.get(self.activity_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
 
     def test_activity_unique_per_day(self):
         """Тест что может быть только одна активность на день"""
@@ -73,8 +97,74 @@ class DailyActivityTest(TestCase):
             'steps': 6000
         }
         response = self.client.post(self.activity_url, data, format='json')
-        # Должно вернуть ошибку валидации
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Повторная отправка за тот же день обновляет существующую запись
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(DailyActivity.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(DailyActivity.objects.get(user=self.user).steps, 6000)
+
+    def test_sources_merged_into_one_day(self):
+        """Тест что данные разных приложений за день объединяются в одну запись"""
+        date = timezone.now()
+        for source_app, steps in [('apple_health', 7000), ('google_fit', 9000), ('apple_health', 6000)]:
+            self.client.post(self.activity_url, {
+                'date': date.isoformat(),
+                'steps': steps,
+                'source_app': source_app
+            }, format='json')
+
+        activity = DailyActivity.objects.get(user=self.user)
+        self.assertEqual(activity.steps, 9000)
+        self.assertEqual(
+            dict(activity.sources.values_list('source_app', 'steps')),
+            {'apple_health': 7000, 'google_fit': 9000}
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 9)
+        self.assertEqual(self.user.overall_steps, 9000)
+
+    @override_settings(ACTIVITY_MERGE_POLICY='priority')
+    def test_priority_merge_policy(self):
+        """Тест политики объединения по приоритету источников"""
+        date = timezone.now()
+        for source_app, steps in [('google_fit', 9000), ('apple_health', 7000)]:
+            self.client.post(self.activity_url, {
+                'date': date.isoformat(),
+                'steps': steps,
+                'source_app': source_app
+            }, format='json')
+        self.assertEqual(DailyActivity.objects.get(user=self.user).steps, 7000)
+
+    def test_day_uses_user_time_zone(self):
+        """Тест что день определяется по часовому поясу пользователя"""
+        self.user.time_zone = 'Asia/Tokyo'
+        self.user.save(update_fields=['time_zone'])
+        date = timezone.now().replace(hour=20, minute=0, second=0, microsecond=0)
+        response = self.client.post(self.activity_url, {'date': date.isoformat(), 'steps': 1000}, format='json')
+        self.assertEqual(response.data['day'], (date + timedelta(days=1)).date().isoformat())
+
+    def test_list_activities_keyset_pages(self):
+        """Тест постраничного получения активностей по курсору"""
+        now = timezone.now()
+        DailyActivity.objects.bulk_create([
+            DailyActivity(user=self.user, date=now - timedelta(days=i), day=(now - timedelta(days=i)).date(), steps=i)
+            for i in range(25)
+        ])
+
+        seen, url, pages = [], f'{self.activity_url}?page_size=10', 0
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertLessEqual(len(queries), 2)
+            seen.extend(item['steps'] for item in response.data['results'])
+            url, pages = response.data['next'], pages + 1
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, list(range(25)))
+
+    def test_invalid_cursor(self):
+        """Тест что некорректный курсор возвращает 404"""
+        response = self.client.get(self.activity_url, {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_activity_requires_authentication(self):
         """Тест что требуется аутентификация"""
@@ -132,7 +222,7 @@ class CoinTransactionTest(TestCase):
         )
         response = self.client.get(self.transactions_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
 
     def test_transactions_require_authentication(self):
         """Тест что требуется аутентификация"""
@@ -159,8 +249,8 @@ class CoinTransactionTest(TestCase):
             reason='Other transaction'
         )
         response = self.client.get(self.transactions_url)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['reason'], 'My transaction')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['reason'], 'My transaction')
 
 
 class DailyRewardSignalTest(TestCase):
@@ -256,3 +346,560 @@ class DailyRewardSignalTest(TestCase):
             user=self.user,
             transaction_type=CoinTransaction.TransactionType.EARNED
         ).exists())
+
+    def test_reward_linked_to_activity(self):
+        """Тест что транзакция награды связана с активностью"""
+        activity = DailyActivity.objects.create(
+            user=self.user,
+            date=timezone.now(),
+            steps=7000
+        )
+        self.assertEqual(activity.reward_transaction.amount, 7)
+
+        with CaptureQueriesContext(connection) as queries:
+            activity.steps = 9000
+            activity.save()
+        lookups = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'steps_tracking_cointransaction' in q['sql']]
+        self.assertEqual(len(lookups), 1)
+        self.assertIn('"activity_id" IN', lookups[0])
+
+
+class DailyActivityBulkSyncTest(TestCase):
+    """Тесты для пакетной синхронизации активностей"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            identifier='test@example.com',
+            password='testpass123',
+            coins=0
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.bulk_url = reverse('daily_activity_bulk_sync')
+        self.start = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def test_bulk_create_and_update(self):
+        """Тест что пакет создает новые дни и обновляет существующие"""
+        DailyActivity.objects.create(user=self.user, date=self.start, steps=6000)
+        data = [
+            {'date': self.start.isoformat(), 'steps': 9000},
+            {'date': (self.start - timedelta(days=1)).isoformat(), 'steps': 7000},
+        ]
+        response = self.client.post(self.bulk_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['updated', 'created'])
+
+        self.user.refresh_from_db()
+        self.assertEqual(DailyActivity.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.user.overall_steps, 16000)
+        self.assertEqual(self.user.coins, 16)
+        self.assertEqual(CoinTransaction.objects.filter(
+            user=self.user,
+            transaction_type=CoinTransaction.TransactionType.EARNED
+        ).count(), 2)
+
+    def test_bulk_items_of_one_day(self):
+        """Тест что только первый элемент нового дня отмечается как созданный"""
+        data = [
+            {'date': self.start.isoformat(), 'steps': 4000, 'source_app': 'apple_health'},
+            {'date': (self.start + timedelta(hours=2)).isoformat(), 'steps': 8000, 'source_app': 'google_fit'},
+        ]
+        response = self.client.post(self.bulk_url, data, format='json')
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'updated'])
+        self.assertEqual(results[0]['id'], results[1]['id'])
+        self.assertEqual(DailyActivity.objects.get(user=self.user).steps, 8000)
+
+    def test_bulk_reports_invalid_items(self):
+        """Тест что ошибки возвращаются для каждого элемента отдельно"""
+        data = [
+            {'date': self.start.isoformat(), 'steps': -5},
+            {'date': self.start.isoformat(), 'steps': 5000},
+            {'steps': 6000},
+        ]
+        response = self.client.post(self.bulk_url, data, format='json')
+        results = response.data['results']
+        self.assertEqual(results[0]['status'], 'error')
+        self.assertEqual(results[1]['status'], 'created')
+        self.assertEqual(results[2]['status'], 'error')
+        self.assertEqual(DailyActivity.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_rejects_non_list(self):
+        """Тест что тело запроса должно быть списком"""
+        response = self.client.post(self.bulk_url, {'steps': 5000}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_year_backfill_bounded_queries(self):
+        """Тест что синхронизация года выполняется за ограниченное число запросов"""
+        def post_days(first_offset, count):
+            data = [
+                {'date': (self.start - timedelta(days=first_offset + i)).isoformat(), 'steps': 5000 + i}
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.bulk_url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        # SQLite splits large INSERTs by its parameter limit, so allow a few extra batches
+        self.assertLessEqual(post_days(0, 365), post_days(400, 30) + 8)
+
+        self.user.refresh_from_db()
+        self.assertEqual(DailyActivity.objects.filter(user=self.user).count(), 395)
+        self.assertEqual(
+            self.user.overall_steps,
+            sum(5000 + i for i in range(30)) + sum(5000 + i for i in range(365))
+        )
+
+
+class ConcurrentSourcesTest(TransactionTestCase):
+    """Тесты одновременной синхронизации нового дня из разных источников"""
+
+    DAYS = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user(identifier='test@example.com', password='testpass123')
+        self.now = timezone.now()
+
+    def test_first_syncs_from_two_sources(self):
+        """Тест что первые синхронизации дня из двух источников сливаются без двойного учёта"""
+        barrier = threading.Barrier(2)
+        submissions = {'apple_health': 6000, 'google_fit': 9000}
+
+        def sync(source_app, steps):
+            try:
+                user = User.objects.get(pk=self.user.pk)
+                for offset in range(self.DAYS):
+                    item = {'date': self.now - timedelta(days=offset), 'steps': steps, 'source_app': source_app}
+                    barrier.wait()
+                    retry_on_lock(lambda: bulk_upsert_activities(user, [item]))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=sync, args=item) for item in submissions.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(DailyActivity.objects.filter(user=self.user).count(), self.DAYS)
+        self.assertFalse(DailyActivity.objects.filter(user=self.user).exclude(steps=9000).exists())
+        self.assertEqual(ActivitySource.objects.filter(activity__user=self.user).count(), 2 * self.DAYS)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.overall_steps, 9000 * self.DAYS)
+        self.assertEqual(self.user.coins, 9 * self.DAYS)
+        self.assertEqual(CoinTransaction.objects.filter(user=self.user).count(), self.DAYS)
+        self.assertEqual(
+            ActivityRollup.objects.filter(user=self.user, period=ActivityRollup.Period.MONTH)
+            .aggregate(total=Sum('steps'))['total'],
+            9000 * self.DAYS
+        )
+
+
+class OverallStepsDeltaTest(TestCase):
+    """Тесты для инкрементального обновления overall_steps"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            identifier='test@example.com',
+            password='testpass123'
+        )
+        self.now = timezone.now()
+
+    def test_create_update_delete(self):
+        """Тест что создание, изменение и удаление меняют сумму шагов"""
+        activity = DailyActivity.objects.create(user=self.user, date=self.now, steps=3000)
+        DailyActivity.objects.create(user=self.user, date=self.now - timedelta(days=1), steps=2000)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.overall_steps, 5000)
+
+        activity = DailyActivity.objects.get(pk=activity.pk)
+        activity.steps = 4500
+        activity.save()
+        activity.steps = 4000
+        activity.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.overall_steps, 6000)
+
+        activity.delete()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.overall_steps, 2000)
+
+    def test_save_queries_do_not_grow_with_history(self):
+        """Тест что число запросов при сохранении не зависит от истории"""
+        def queries_for_save(offset):
+            with CaptureQueriesContext(connection) as queries:
+                DailyActivity.objects.create(user=self.user, date=self.now + timedelta(days=offset), steps=1000)
+            return len(queries)
+
+        before = queries_for_save(1)
+        DailyActivity.objects.bulk_create([
+            DailyActivity(user=self.user, date=self.now - timedelta(days=i + 10),
+                          day=(self.now - timedelta(days=i + 10)).date(), steps=1000)
+            for i in range(500)
+        ])
+        self.assertEqual(queries_for_save(2), before)
+
+    def test_save_updates_user_row_once(self):
+        """Тест что сохранение активности обновляет строку пользователя одним запросом"""
+        def user_updates(queries):
+            return [query for query in queries if query['sql'].startswith('UPDATE "users_customuser"')]
+
+        with CaptureQueriesContext(connection) as queries, self.assertNumQueries(9):
+            activity = DailyActivity.objects.create(user=self.user, date=self.now, steps=7000)
+        self.assertEqual(len(user_updates(queries)), 1)
+
+        with CaptureQueriesContext(connection) as queries, self.assertNumQueries(10):
+            activity.steps = 9000
+            activity.save()
+        self.assertEqual(len(user_updates(queries)), 1)
+
+        # Same reward, so the transaction is not even looked up
+        with self.assertNumQueries(5):
+            activity.steps = 9500
+            activity.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.coins, self.user.overall_steps), (9, 9500))
+
+    def test_reconcile_command_fixes_drift(self):
+        """Тест что команда сверки исправляет расхождения"""
+        DailyActivity.objects.create(user=self.user, date=self.now, steps=3000)
+        User.objects.filter(pk=self.user.pk).update(overall_steps=42)
+
+        call_command('reconcile_overall_steps', chunk_size=1, stdout=StringIO())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.overall_steps, 3000)
+
+
+class CoinLedgerTest(TestCase):
+    """Тесты для журнала коинов и контрольных точек баланса"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            identifier='test@example.com',
+            password='testpass123',
+            coins=10
+        )
+
+    def post(self, amount, **kwargs):
+        return post_transaction(self.user, amount, CoinTransaction.TransactionType.ADJUSTMENT, 'Test', **kwargs)
+
+    def test_debit_requires_funds(self):
+        """Тест что списание без достаточного баланса отклоняется"""
+        self.post(-4, allow_negative=False)
+        with self.assertRaises(InsufficientCoins):
+            self.post(-7, allow_negative=False)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 6)
+        self.assertEqual(CoinTransaction.objects.filter(user=self.user).count(), 1)
+
+    @override_settings(COIN_CHECKPOINT_INTERVAL=3)
+    def test_checkpoints_every_interval(self):
+        """Тест что контрольная точка создаётся каждые N транзакций"""
+        transactions = [self.post(amount) for amount in (1, 2, 3, 4, 5, 6, 7)]
+
+        checkpoints = list(BalanceCheckpoint.objects.filter(user=self.user).order_by('last_transaction_id'))
+        self.assertEqual([checkpoint.balance for checkpoint in checkpoints], [16, 31])
+        self.assertEqual(checkpoints[1].last_transaction_id, transactions[5].pk)
+
+    @override_settings(COIN_CHECKPOINT_INTERVAL=2)
+    def test_balance_as_of(self):
+        """Тест расчёта баланса на момент времени от ближайшей контрольной точки"""
+        start = timezone.now() - timedelta(days=10)
+        for offset, amount in enumerate((5, -3, 8, 2, -1)):
+            txn = self.post(amount)
+            CoinTransaction.objects.filter(pk=txn.pk).update(created_at=start + timedelta(days=offset))
+        for checkpoint in BalanceCheckpoint.objects.filter(user=self.user):
+            checkpoint.as_of = CoinTransaction.objects.get(pk=checkpoint.last_transaction_id).created_at
+            checkpoint.save()
+
+        self.assertEqual(balance_as_of(self.user, start - timedelta(hours=1)), 10)
+        self.assertEqual(balance_as_of(self.user, start), 15)
+        self.assertEqual(balance_as_of(self.user, start + timedelta(days=3)), 22)
+        self.assertEqual(balance_as_of(self.user, timezone.now()), 21)
+
+    @override_settings(COIN_CHECKPOINT_INTERVAL=1)
+    def test_amended_reward_shifts_checkpoints(self):
+        """Тест что изменение награды за прошлый день обновляет контрольные точки"""
+        activity = DailyActivity.objects.create(user=self.user, date=timezone.now() - timedelta(days=1), steps=6000)
+        self.post(4)
+
+        activity.steps = 9000
+        activity.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 23)
+        latest = BalanceCheckpoint.objects.filter(user=self.user).order_by('-last_transaction_id').first()
+        self.assertEqual(latest.balance, 23)
+
+
+
+class IntradayStepsTest(TestCase):
+    """Тесты для поминутных данных о шагах"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            identifier='test@example.com',
+            password='testpass123'
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.intraday_url = reverse('intraday_steps')
+        self.start = timezone.now().replace(hour=8, minute=0, second=0, microsecond=0)
+
+    def post_samples(self, minutes, steps=100, source_app='apple_health'):
+        return self.client.post(self.intraday_url, {
+            'source_app': source_app,
+            'samples': [
+                {'timestamp': (self.start + timedelta(minutes=m)).isoformat(), 'steps': steps}
+                for m in minutes
+            ]
+        }, format='json')
+
+    def test_ingest_rolls_up_into_daily_activity(self):
+        """Тест что поминутные данные суммируются в дневную активность"""
+        response = self.post_samples(range(30))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.post_samples(range(30, 60))
+
+        activity = DailyActivity.objects.get(user=self.user)
+        self.assertEqual(activity.steps, 6000)
+        self.assertEqual(activity.sources.get().source_app, 'apple_health')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 6)
+
+        series = IntradayStepSeries.objects.get(user=self.user)
+        self.assertEqual(unpack_samples(series.samples)[-1], (8 * 60 + 59, 100))
+
+    def test_samples_are_stored_compactly(self):
+        """Тест что поминутный ряд занимает пару байт на минуту и переживает дозапись"""
+        self.post_samples(range(0, 120, 2), steps=40)
+        self.post_samples(range(120, 240), steps=110)
+        self.post_samples([600], steps=3000)
+
+        series = IntradayStepSeries.objects.get(user=self.user)
+        # Quiet minutes take a step byte and a gap byte, walking minutes two step bytes;
+        # the first sample, the first walking minute and the burst carry wider gaps or counts
+        self.assertEqual(len(series.samples), 60 * 2 + 120 * 2 + 2 + 2 + 1 + 1)
+        samples = unpack_samples(series.samples)
+        self.assertEqual(len(samples), 181)
+        self.assertEqual(samples[:2], [(8 * 60, 40), (8 * 60 + 2, 40)])
+        self.assertEqual(samples[60], (8 * 60 + 120, 110))
+        self.assertEqual(samples[-1], (8 * 60 + 600, 3000))
+
+    def test_repeated_samples_are_skipped(self):
+        """Тест что повторно отправленные минуты не учитываются"""
+        self.post_samples(range(10))
+        response = self.post_samples(range(5, 15))
+        self.assertEqual(response.data['days'][0]['accepted'], 5)
+        self.assertEqual(response.data['days'][0]['skipped'], 5)
+        self.assertEqual(DailyActivity.objects.get(user=self.user).steps, 1500)
+
+    def test_sources_keep_separate_series(self):
+        """Тест что у каждого источника свой поминутный ряд и своя сумма"""
+        self.post_samples(range(30))
+        response = self.post_samples(range(10, 40), source_app='google_fit')
+        self.assertEqual(response.data['days'][0]['accepted'], 30)
+
+        activity = DailyActivity.objects.get(user=self.user)
+        self.assertEqual(
+            dict(activity.sources.values_list('source_app', 'steps')),
+            {'apple_health': 3000, 'google_fit': 3000}
+        )
+        self.assertEqual(activity.steps, 3000)
+        self.assertEqual(IntradayStepSeries.objects.filter(user=self.user).count(), 2)
+
+        response = self.client.get(self.intraday_url, {
+            'day': self.start.date().isoformat(), 'source_app': 'google_fit'
+        })
+        self.assertEqual(response.data['samples'][0], {'minute': 8 * 60 + 10, 'steps': 100})
+
+    def test_get_day_samples(self):
+        """Тест получения поминутных данных за день"""
+        self.post_samples([0, 1])
+        response = self.client.get(self.intraday_url, {'day': self.start.date().isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['samples'], [
+            {'minute': 480, 'steps': 100},
+            {'minute': 481, 'steps': 100},
+        ])
+
+
+class ActivitySummaryTest(TestCase):
+    """Тесты для недельных и месячных сводок"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            identifier='test@example.com',
+            password='testpass123'
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.summary_url = reverse('activity_summary')
+        # Понедельник
+        self.monday = timezone.now().replace(year=2025, month=3, day=3, hour=12, minute=0, second=0, microsecond=0)
+
+    def test_rollups_follow_saves_and_deletes(self):
+        """Тест что сводки обновляются при сохранении и удалении"""
+        first = DailyActivity.objects.create(user=self.user, date=self.monday, steps=3000, distance_km=2.0)
+        DailyActivity.objects.create(user=self.user, date=self.monday + timedelta(days=6), steps=4000)
+        DailyActivity.objects.create(user=self.user, date=self.monday + timedelta(days=7), steps=5000)
+
+        week = ActivityRollup.objects.get(user=self.user, period='week', period_start=self.monday.date())
+        self.assertEqual((week.steps, week.active_days, week.distance_km), (7000, 2, 2.0))
+        month = ActivityRollup.objects.get(user=self.user, period='month', period_start=self.monday.date().replace(day=1))
+        self.assertEqual(month.steps, 12000)
+
+        first.steps = 1000
+        first.save()
+        first.delete()
+        week.refresh_from_db()
+        self.assertEqual((week.steps, week.active_days, week.distance_km), (4000, 1, 0.0))
+
+    def test_summary_endpoint(self):
+        """Тест получения сводки по неделям за диапазон дат"""
+        self.client.post(reverse('daily_activity_bulk_sync'), [
+            {'date': (self.monday + timedelta(days=i)).isoformat(), 'steps': 1000} for i in range(10)
+        ], format='json')
+
+        start = self.monday.date()
+        response = self.client.get(self.summary_url, {
+            'period': 'week',
+            'range': f'{start.isoformat()},{(start + timedelta(days=20)).isoformat()}'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['steps'] for row in response.data['results']], [7000, 3000, 0])
+
+    def test_summary_rejects_unknown_period(self):
+        """Тест что неизвестный период отклоняется"""
+        response = self.client.get(self.summary_url, {'period': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_command_matches_incremental_rollups(self):
+        """Тест что пересчет сводок совпадает с инкрементальными значениями"""
+        for i in range(40):
+            DailyActivity.objects.create(user=self.user, date=self.monday + timedelta(days=i * 2), steps=1000 + i)
+        incremental = list(ActivityRollup.objects.filter(user=self.user).values_list('period', 'period_start', 'steps', 'active_days'))
+
+        call_command('rebuild_activity_rollups', stdout=StringIO())
+        rebuilt = list(ActivityRollup.objects.filter(user=self.user).values_list('period', 'period_start', 'steps', 'active_days'))
+        self.assertEqual(sorted(incremental), sorted(rebuilt))
+
+
+@override_settings(STEPS_RECOMPUTE_ASYNC=True)
+class RecomputeQueueTest(TestCase):
+    """Тесты для очереди пересчёта наград и сумм шагов"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            identifier='test@example.com',
+            password='testpass123'
+        )
+        self.now = timezone.now()
+
+    def test_saves_enqueue_one_job(self):
+        """Тест что сохранения только ставят одну задачу на пользователя"""
+        activity = DailyActivity.objects.create(user=self.user, date=self.now, steps=7000)
+        activity.steps = 12000
+        activity.save()
+        DailyActivity.objects.create(user=self.user, date=self.now - timedelta(days=1), steps=3000)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.overall_steps, 0)
+        self.assertFalse(CoinTransaction.objects.exists())
+        job = RecomputeJob.objects.get(user=self.user)
+        self.assertEqual(job.version, 3)
+
+        call_command('process_recompute_jobs', once=True, stdout=StringIO())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.overall_steps, 15000)
+        self.assertEqual(self.user.coins, 12)
+        self.assertEqual(CoinTransaction.objects.get(activity=activity).amount, 12)
+        self.assertEqual(
+            ActivityRollup.objects.filter(user=self.user, period=ActivityRollup.Period.MONTH)
+            .aggregate(total=Sum('steps'))['total'],
+            15000
+        )
+        self.assertFalse(RecomputeJob.objects.exists())
+
+    def test_api_writes_only_enqueue(self):
+        """Тест что запись через API только ставит задачу и не начисляет монеты"""
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        response = self.client.post(reverse('daily_activity_list_create'), {'steps': 9000}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client.post(reverse('daily_activity_bulk_sync'), [
+            {'date': (self.now - timedelta(days=1)).isoformat(), 'steps': 6000}
+        ], format='json')
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 0)
+        self.assertEqual(self.user.overall_steps, 0)
+        self.assertFalse(CoinTransaction.objects.exists())
+        self.assertFalse(ActivityRollup.objects.exists())
+        self.assertEqual(RecomputeJob.objects.filter(user=self.user).count(), 1)
+
+        process_batch(10)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 15)
+        self.assertEqual(self.user.overall_steps, 15000)
+
+    def test_recompute_removes_stale_reward(self):
+        """Тест что пересчёт убирает награду после удаления активности"""
+        activity = DailyActivity.objects.create(user=self.user, date=self.now, steps=7000)
+        process_batch(10)
+        activity.steps = 1000
+        activity.save()
+        process_batch(10)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 0)
+        self.assertFalse(CoinTransaction.objects.exists())
+
+    def test_failed_job_is_retried_later(self):
+        """Тест что упавшая задача откладывается с ошибкой"""
+        DailyActivity.objects.create(user=self.user, date=self.now, steps=7000)
+        with mock.patch('steps_tracking.jobs.recompute_user', side_effect=RuntimeError('boom')):
+            self.assertEqual(process_batch(10), (0, 1))
+
+        job = RecomputeJob.objects.get(user=self.user)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('boom', job.last_error)
+        self.assertEqual(process_batch(10), (0, 0))
+
+    def test_new_write_revives_failed_job(self):
+        """Тест что новая запись возвращает исчерпавшую попытки задачу в очередь"""
+        DailyActivity.objects.create(user=self.user, date=self.now - timedelta(days=1), steps=3000)
+        RecomputeJob.objects.update(attempts=settings.STEPS_RECOMPUTE_MAX_ATTEMPTS, last_error='boom')
+        self.assertEqual(process_batch(10), (0, 0))
+
+        DailyActivity.objects.create(user=self.user, date=self.now, steps=7000)
+        job = RecomputeJob.objects.get(user=self.user)
+        self.assertEqual((job.attempts, job.last_error), (0, ''))
+        self.assertEqual(process_batch(10), (1, 0))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.overall_steps, 10000)
+
+    def test_metrics_endpoint(self):
+        """Тест что метрики очереди доступны только администратору"""
+        DailyActivity.objects.create(user=self.user, date=self.now, steps=7000)
+        url = reverse('recompute_queue_metrics')
+
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = User.objects.create_superuser('admin@example.com', password='testpass123')
+        refresh = RefreshToken.for_user(admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['depth'], 1)
+        self.assertEqual(response.data['failed'], 0)
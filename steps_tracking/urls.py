@@ -1,7 +1,12 @@
 from django.urls import path
-from .views import DailyActivityListCreateView, CoinTransactionListView
+from .views import (DailyActivityListCreateView, DailyActivityBulkSyncView, ActivitySummaryView, IntradayStepsView,
+                    CoinTransactionListView, RecomputeQueueMetricsView)
 
 urlpatterns = [
     path('activity/', DailyActivityListCreateView.as_view(), name='daily_activity_list_create'),
+    path('activity/bulk/', DailyActivityBulkSyncView.as_view(), name='daily_activity_bulk_sync'),
+    path('activity/summary/', ActivitySummaryView.as_view(), name='activity_summary'),
+    path('intraday/', IntradayStepsView.as_view(), name='intraday_steps'),
     path('transactions/', CoinTransactionListView.as_view(), name='coin_transaction_list'),
+    path('recompute/metrics/', RecomputeQueueMetricsView.as_view(), name='recompute_queue_metrics'),
 ]
\ No newline at end of file
@@ -1,35 +1,189 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from rest_framework import serializers
-from django.db import IntegrityError
-from .models import DailyActivity, CoinTransaction
-from .serializers import DailyActivitySerializer, CoinTransactionSerializer
+from rest_framework.views import APIView
+from idempotency.mixins import IdempotentMixin
+from .intraday import ingest_samples, unpack_samples
+from .jobs import queue_metrics
+from .models import DailyActivity, CoinTransaction, IntradayStepSeries, ActivityRollup
+from .pagination import DailyActivityPagination, CoinTransactionPagination
+from .rollups import period_start, next_period_start, previous_period_start
+from .serializers import (DailyActivitySerializer, CoinTransactionSerializer, IntradayIngestSerializer,
+                          ActivityRollupSerializer)
+from .services import bulk_upsert_activities
 
-class DailyActivityListCreateView(generics.ListCreateAPIView):
+MAX_BULK_ACTIVITIES = 400
+DEFAULT_SUMMARY_PERIODS = 12
+MAX_SUMMARY_PERIODS = 260
+
+
+class DailyActivityListCreateView(IdempotentMixin, generics.ListCreateAPIView):
     serializer_class = DailyActivitySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = DailyActivityPagination
 
     def get_queryset(self):
-        return DailyActivity.objects.filter(user=self.request.user)
-
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        return DailyActivity.objects.filter(user=self.request.user).select_related('user')
 
     def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        [(activity, created)] = bulk_upsert_activities(request.user, [serializer.validated_data])
+        return Response(
+            self.get_serializer(activity).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+class DailyActivityBulkSyncView(IdempotentMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if not isinstance(request.data, list):
+            return Response({'detail': 'Expected a list of activities.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(request.data) > MAX_BULK_ACTIVITIES:
+            return Response(
+                {'detail': f'A batch may contain at most {MAX_BULK_ACTIVITIES} activities.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = [None] * len(request.data)
+        valid, valid_indexes = [], []
+
+        for index, item in enumerate(request.data):
+            serializer = DailyActivitySerializer(data=item)
+            if not serializer.is_valid():
+                results[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+                continue
+
+            if 'date' not in serializer.validated_data:
+                results[index] = {'index': index, 'status': 'error', 'errors': {'date': ['This field is required.']}}
+                continue
+
+            valid.append(serializer.validated_data)
+            valid_indexes.append(index)
+
+        upserted = bulk_upsert_activities(request.user, valid)
+
+        for index, (activity, created) in zip(valid_indexes, upserted):
+            results[index] = {
+                'index': index,
+                'status': 'created' if created else 'updated',
+                'id': activity.id,
+                'day': activity.day,
+            }
+
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+class ActivitySummaryView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        period = request.query_params.get('period', ActivityRollup.Period.WEEK)
+        if period not in ActivityRollup.Period.values:
+            return Response({'period': ['Expected "week" or "month".']}, status=status.HTTP_400_BAD_REQUEST)
+
+        bounds = self.get_bounds(request, period)
+        if bounds is None:
+            return Response(
+                {'range': [f'Expected a period count up to {MAX_SUMMARY_PERIODS} or "<start>,<end>" dates.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        start, end = bounds
+
+        rollups = {
+            rollup.period_start: rollup
+            for rollup in ActivityRollup.objects.filter(
+                user=request.user,
+                period=period,
+                period_start__range=(start, end)
+            )
+        }
+
+        results = []
+        current = start
+        while current <= end:
+            results.append(rollups.get(current) or ActivityRollup(period=period, period_start=current))
+            current = next_period_start(period, current)
+
+        return Response({
+            'period': period,
+            'results': ActivityRollupSerializer(results, many=True).data
+        })
+
+    def get_bounds(self, request, period):
+        value = request.query_params.get('range', str(DEFAULT_SUMMARY_PERIODS))
+
+        if ',' in value:
+            try:
+                first, last = (parse_date(part.strip()) for part in value.split(',', 1))
+            except ValueError:
+                return None
+            if first is None or last is None or first > last:
+                return None
+            start, end = period_start(period, first), period_start(period, last)
+            current, count = start, 1
+            while current < end:
+                current, count = next_period_start(period, current), count + 1
+                if count > MAX_SUMMARY_PERIODS:
+                    return None
+            return start, end
+
+        if not value.isdigit() or not 0 < int(value) <= MAX_SUMMARY_PERIODS:
+            return None
+        end = period_start(period, request.user.local_date(timezone.now()))
+        start = end
+        for _ in range(int(value) - 1):
+            start = previous_period_start(period, start)
+        return start, end
+
+class IntradayStepsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
         try:
-            return super().create(request, *args, **kwargs)
-        except IntegrityError as e:
-            if 'unique' in str(e).lower():
-                return Response(
-                    {'date': ['An activity record for this date already exists.']},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            raise
+            day = parse_date(request.query_params.get('day', ''))
+        except ValueError:
+            day = None
+        series = IntradayStepSeries.objects.filter(user=request.user, day=day)
+        if request.query_params.get('source_app'):
+            series = series.filter(source_app=request.query_params['source_app'])
+        # Without a source, the series with the most steps, like the max merge of the day
+        series = series.order_by('-total_steps', 'source_app').first() if day else None
+        if series is None:
+            return Response({'detail': 'No samples for this day.'}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            'day': series.day,
+            'source_app': series.source_app,
+            'total_steps': series.total_steps,
+            'samples': [{'minute': minute, 'steps': steps} for minute, steps in unpack_samples(series.samples)],
+        })
+
+    def post(self, request):
+        serializer = IntradayIngestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = ingest_samples(
+            request.user,
+            serializer.validated_data['samples'],
+            serializer.validated_data.get('source_app')
+        )
+        return Response({
+            'days': [{'day': day, **result} for day, result in results.items()]
+        }, status=status.HTTP_200_OK)
 
 class CoinTransactionListView(generics.ListAPIView):
     serializer_class = CoinTransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CoinTransactionPagination
 
     def get_queryset(self):
-        return CoinTransaction.objects.filter(user=self.request.user)
\ No newline at end of file
+        return CoinTransaction.objects.filter(user=self.request.user)
+
+class RecomputeQueueMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(queue_metrics(), status=status.HTTP_200_OK)
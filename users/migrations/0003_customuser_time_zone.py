@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_customuser_is_partner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='time_zone',
+            field=models.CharField(default='UTC', max_length=63, verbose_name='Time Zone'),
+        ),
+    ]
@@ -1,4 +1,6 @@
+from zoneinfo import ZoneInfo
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import BaseUserManager,AbstractBaseUser,PermissionsMixin
 from django.utils.translation import gettext_lazy as _
 
@@ -40,6 +42,7 @@ class CustomUser(AbstractBaseUser,PermissionsMixin):
     coins = models.IntegerField(default=0)
     overall_steps = models.IntegerField(default=0)
     is_partner = models.BooleanField(default=False, verbose_name="Is Partner Account")
+    time_zone = models.CharField(_('Time Zone'), max_length=63, default='UTC')
 
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
@@ -54,5 +57,10 @@ class CustomUser(AbstractBaseUser,PermissionsMixin):
     def get_full_name(self):
         return '%s %s' % (self.first_name, self.last_name)
 
+    def local_date(self, moment):
+        if timezone.is_naive(moment):
+            return moment.date()
+        return timezone.localtime(moment, ZoneInfo(self.time_zone)).date()
+
     def __str__(self):
         return self.email or self.phone_number or "User (No identifier)"
\ No newline at end of file
@@ -1,3 +1,4 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.db.models import Q
@@ -61,6 +62,14 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'phone_number',
             'coins',
             'overall_steps',
+            'time_zone',
             'is_active',
         ]
-        read_only_fields = ['id', 'email', 'phone_number', 'coins', 'overall_steps', 'is_active']
\ No newline at end of file
+        read_only_fields = ['id', 'email', 'phone_number', 'coins', 'overall_steps', 'is_active']
+
+    def validate_time_zone(self, value):
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise serializers.ValidationError("Unknown time zone.")
+        return value
\ No newline at end of file